@@ -0,0 +1,195 @@
+// A long-lived Scoop process, taking capture requests over a Unix socket, so that captures
+// don't each pay for starting Node and loading Scoop and its dependencies. One capture at a time.
+// See ScoopServer in web/main/containers.py.
+//
+//   POST /capture {"url": "...", "options": {...Scoop CLI options...}}
+//     streams Scoop's log lines back, interleaved with "SCOOP-EVENT <json>" lines reporting progress
+//     (see emit, below), followed by a final "SCOOP-EXIT <exit code>" line
+//   POST /stop
+//     asks the capture in progress to stop recording and save what it has, as a partial capture, just as
+//     Scoop does on reaching its capture timeout; responds "SCOOP-EXIT <exit code>" once it has been saved
+//   GET /health
+//     responds "ok"
+//
+// On SIGTERM, the capture in progress is stopped the same way before the server exits.
+
+import http from 'http'
+import { mkdir, writeFile } from 'fs/promises'
+import { dirname, join } from 'path'
+import { Scoop } from '@harvard-lil/scoop'
+
+const socketPath = process.argv[2] || '/tmp/scoop.sock'
+
+// CLI options that control where output goes, rather than how Scoop captures
+const outputOptions = ['output', 'json-summary-output', 'export-attachments-output', 'format']
+
+function toScoopOptions (cliOptions) {
+  const options = {}
+  for (const [key, value] of Object.entries(cliOptions)) {
+    if (outputOptions.includes(key)) {
+      continue
+    }
+    const name = key.replace(/-([a-z])/g, (_, letter) => letter.toUpperCase())
+    if (value === 'true' || value === 'false') {
+      options[name] = value === 'true'
+    } else if (/^\d+$/.test(value)) {
+      options[name] = Number(value)
+    } else {
+      options[name] = value
+    }
+  }
+  return options
+}
+
+// Report progress as a machine-readable event, one JSON object per line:
+//   {"event": "step", "number": 1, "total": 13, "name": "Intercepter"}   a capture step has started
+//   {"event": "progress", "exchanges": 42, "bytes": 1234567}            exchanges and bytes recorded so far
+//   {"event": "exporting"}                                               recording is over; writing the WACZ
+//   {"event": "exported", "path": "...", "bytes": 1234567}               the WACZ has been written
+//   {"event": "attachment", "filename": "...", "bytes": 1234}            an attachment has been written
+function emit (res, event, data = {}) {
+  res.write(`SCOOP-EVENT ${JSON.stringify({ event, ...data })}\n`)
+}
+
+// Scoop (as of 0.3) has no hooks for its capture steps, but announces each one through its logger,
+// so pick those announcements out as they are logged, rather than leaving it to whoever reads the output.
+const stepPattern = /STEP \[(\d+)\/(\d+)\]:\s*(.*)$/
+
+// Send everything Scoop logs to the response, as the CLI would print it.
+function captureConsole (res) {
+  const methods = ['log', 'info', 'warn', 'error', 'debug', 'trace']
+  const originals = Object.fromEntries(methods.map(method => [method, console[method]]))
+  for (const method of methods) {
+    console[method] = (...args) => {
+      const line = args.join(' ')
+      res.write(line + '\n')
+      const step = (method === 'info' || method === 'log') && line.match(stepPattern)
+      if (step) {
+        emit(res, 'step', { number: Number(step[1]), total: Number(step[2]), name: step[3] })
+      }
+    }
+  }
+  return () => Object.assign(console, originals)
+}
+
+// Report exchanges and bytes recorded, whenever they change, until stopped.
+function reportProgress (capture, res, intervalMs = 1000) {
+  let last = null
+  const report = () => {
+    const progress = {
+      exchanges: capture.exchanges.length,
+      bytes: capture.intercepter?.byteLength ?? null
+    }
+    if (JSON.stringify(progress) !== JSON.stringify(last)) {
+      emit(res, 'progress', progress)
+      last = progress
+    }
+  }
+  const interval = setInterval(report, intervalMs)
+  return () => {
+    clearInterval(interval)
+    report()
+  }
+}
+
+// The capture in progress, if any: { capture, stop(), done }
+let current = null
+
+// Stop recording, keeping what has been captured so far.
+async function stopRecording (capture) {
+  if (capture.state === Scoop.states.CAPTURE) {
+    console.log('Stop requested: ending further capture.')
+    capture.state = Scoop.states.PARTIAL
+    await capture.teardown()
+  }
+}
+
+async function capture (url, cliOptions, res) {
+  const capture = new Scoop(url, toScoopOptions(cliOptions))
+  current.capture = capture
+  const stopReporting = reportProgress(capture, res)
+  try {
+    await capture.capture()
+  } finally {
+    stopReporting()
+  }
+
+  emit(res, 'exporting')
+  const wacz = Buffer.from(await capture.toWACZ(cliOptions.format === 'wacz-with-raw'))
+  await mkdir(dirname(cliOptions.output), { recursive: true })
+  await writeFile(cliOptions.output, wacz)
+  console.log(`Capture saved to disk: ${cliOptions.output}`)
+  emit(res, 'exported', { path: cliOptions.output, bytes: wacz.byteLength })
+
+  if (cliOptions['export-attachments-output']) {
+    await mkdir(cliOptions['export-attachments-output'], { recursive: true })
+    for (const [filename, exchange] of Object.entries(await capture.extractGeneratedExchanges())) {
+      await writeFile(join(cliOptions['export-attachments-output'], filename), exchange.response.body)
+      emit(res, 'attachment', { filename, bytes: exchange.response.body.byteLength })
+    }
+  }
+
+  if (cliOptions['json-summary-output']) {
+    await writeFile(cliOptions['json-summary-output'], JSON.stringify(await capture.summary(), null, 2))
+  }
+
+  return capture.state === Scoop.states.FAILED ? 1 : 0
+}
+
+async function stop () {
+  if (current?.capture) {
+    await stopRecording(current.capture)
+  }
+  return current?.done
+}
+
+const server = http.createServer(async (req, res) => {
+  if (req.method === 'GET' && req.url === '/health') {
+    res.end('ok\n')
+    return
+  }
+  if (req.method === 'POST' && req.url === '/stop') {
+    if (!current) {
+      res.writeHead(409).end()
+      return
+    }
+    res.end(`SCOOP-EXIT ${await stop()}\n`)
+    return
+  }
+  if (req.method !== 'POST' || req.url !== '/capture') {
+    res.writeHead(404).end()
+    return
+  }
+  if (current) {
+    res.writeHead(409).end()
+    return
+  }
+
+  let finish
+  current = { capture: null, done: new Promise(resolve => { finish = resolve }) }
+  let body = ''
+  for await (const chunk of req) {
+    body += chunk
+  }
+  res.writeHead(200, { 'Content-Type': 'text/plain' })
+  const restoreConsole = captureConsole(res)
+  let exitCode = 1
+  try {
+    const { url, options } = JSON.parse(body)
+    exitCode = await capture(url, options, res)
+  } catch (err) {
+    console.error(`ERROR ${err.stack || err}`)
+  } finally {
+    restoreConsole()
+    current = null
+    finish(exitCode)
+    res.end(`SCOOP-EXIT ${exitCode}\n`)
+  }
+})
+
+process.on('SIGTERM', async () => {
+  await stop()
+  process.exit(0)
+})
+
+server.listen(socketPath, () => console.log(`Scoop server listening on ${socketPath}`))
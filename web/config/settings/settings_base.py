@@ -257,8 +257,19 @@ CELERY_TASK_EAGER_PROPAGATES = True  # propagate exceptions when CELERY_TASK_ALW
 # Mentioning a new queue creates it.
 CELERY_TASK_ROUTES = {}
 
-# from celery.schedules import crontab
-CELERY_BEAT_SCHEDULE = {}
+from celery.schedules import crontab
+CELERY_BEAT_SCHEDULE = {
+    # fail capture jobs that have been in progress for longer than CELERY_TASK_TIME_LIMIT
+    'clean-up-failed-captures': {
+        'task': 'main.tasks.clean_up_failed_captures',
+        'schedule': crontab(minute='*'),
+    },
+    # repair any drift between the capture queue backend and the database; see main.queues
+    'reconcile-capture-queue': {
+        'task': 'main.tasks.reconcile_capture_queue',
+        'schedule': crontab(minute='*'),
+    },
+}
 
 ### \END CELERY settings ###
 
@@ -302,13 +313,23 @@ DEFAULT_S3_STORAGE = {
 }
 OVERRIDE_STORAGE_NETLOC = None
 
+# Archives are read, hashed and uploaded in parts of this size (at least 5MB, S3's minimum),
+# this many at a time, with this many attempts per part
+ARCHIVE_UPLOAD_PART_SIZE = 16 * 1024 * 1024
+ARCHIVE_UPLOAD_CONCURRENCY = 4
+ARCHIVE_UPLOAD_PART_ATTEMPTS = 3
+
 # Scoop
 SCOOP_BUILD_CONTEXT = os.path.abspath(os.path.join(BASE_DIR, '../../docker/scoop'))
-SCOOP_IMAGE = 'scoop:0.3.1-1'
+SCOOP_IMAGE = 'scoop:0.3.1-3'
 SCOOP_DOCKER_NETWORK = None
 SCOOP_PROXY_PORT = os.environ.get('SCOOP_PROXY_PORT') or '9999'
 
 SCOOP_FATAL_TIMEOUT_SECONDS = 60 * 5
+# When a capture hits SCOOP_FATAL_TIMEOUT_SECONDS or the soft time limit, Scoop is asked to stop, and, if it's
+# running as a server (see SCOOP_SERVER_MODE), to save what it has recorded as a partial capture; it is killed if it
+# hasn't finished within this grace period. Keep this well within the gap between the soft and hard time limits.
+SCOOP_STOP_GRACE_SECONDS = 30
 
 SCOOP_ALLOW_VIDEO_AS_ATTACHMENT = True
 SCOOP_MAX_RECORDING_MILLISECONDS = 60 * 4 * 1000
@@ -324,8 +345,62 @@ SCOOP_USER_AGENT_SUFFIX = None
 
 SCOOP_CUSTOM_BLOCKLIST = None
 SCOOP_LOG_LEVEL = "trace"
+# Each process keeps a single Docker client, with up to this many pooled connections, checking that
+# it's still connected at most this often.
+DOCKER_CLIENT_MAX_POOL_SIZE = 10
+DOCKER_CLIENT_HEALTH_CHECK_SECONDS = 30
+# How many idle Scoop containers each worker host keeps started and ready to be handed a capture,
+# and how long one may sit idle before being replaced. Set the size to 0 to create a container for each capture.
+SCOOP_CONTAINER_POOL_SIZE = 2
+SCOOP_CONTAINER_POOL_MAX_AGE_SECONDS = 60 * 60
+# Optionally, a Docker volume (or host directory) for Scoop to write its output to, so that workers can read
+# archives straight from disk instead of copying them out of containers; it must also be mounted in the worker,
+# at SCOOP_OUTPUT_VOLUME_LOCAL_PATH. A tmpfs-backed volume keeps archives off disk altogether.
+SCOOP_OUTPUT_VOLUME = None
+SCOOP_OUTPUT_VOLUME_LOCAL_PATH = None
+# Files streamed out of Scoop containers are kept in memory up to this size, then spooled to disk
+EXTRACTED_FILE_MAX_MEMORY_SIZE = 10 * 1024 * 1024
+# Run captures in long-lived Scoop servers, one for each capture a worker process runs at once (see CAPTURE_CONCURRENCY),
+# instead of starting Scoop afresh in a new container for each capture. Servers are replaced after
+# SCOOP_SERVER_MAX_CAPTURES captures, or once their memory use exceeds SCOOP_SERVER_MAX_MEMORY_BYTES.
+# If a server can't be started, we fall back to the one-shot mode.
+SCOOP_SERVER_MODE = False
+SCOOP_SERVER_MAX_CAPTURES = 50
+SCOOP_SERVER_MAX_MEMORY_BYTES = 3 * 1024 ** 3
+SCOOP_SERVER_STARTUP_TIMEOUT_SECONDS = 30
+# How often to sample the stats of each capture's container, to record the memory, CPU time, and network and
+# block I/O it used on its CaptureJob. Set to None to skip sampling.
+SCOOP_STATS_SAMPLE_SECONDS = 1
 
 LAUNCH_CAPTURE_JOBS = True
+# How many capture jobs each run_next_capture task claims at once. Jobs in a batch are captured one after another;
+# any that can't be started before CELERY_TASK_SOFT_TIME_LIMIT are released back to the queue.
+CAPTURE_BATCH_SIZE = 1
+# How many captures each run_next_capture task may run at once, resources permitting (see CELERY_RESOURCE_LIMITS).
+# Above 1, an asyncio supervisor claims jobs one at a time as captures finish, instead of in batches;
+# it checks for newly submitted jobs every CAPTURE_SUPERVISOR_POLL_SECONDS.
+CAPTURE_CONCURRENCY = 1
+CAPTURE_SUPERVISOR_POLL_SECONDS = 1
+# How many run_next_capture tasks may be queued or running at once: set this to the number of capture worker processes.
+# Submitting jobs wakes idle workers, up to this many, rather than sending a task per job.
+CAPTURE_WORKER_COUNT = 10
+# Save each capture job's progress, as Scoop reaches milestones, at most this often, so that busy captures
+# don't update the database for every log line. Final progress is always saved along with the job's status.
+CAPTURE_PROGRESS_SAVE_INTERVAL_MS = 1000
+# Once Scoop is done, hand each capture off to a finalize_capture task, which saves the archive and screenshot,
+# so that the capture worker can move on to the next job. This requires SCOOP_OUTPUT_VOLUME, mounted wherever
+# finalize_capture runs; route the task to a queue of its own, with CELERY_TASK_ROUTES. Captures still count
+# as in progress until finalized, so finalization must finish within CELERY_TASK_TIME_LIMIT of the capture starting.
+CAPTURE_DEFERRED_FINALIZATION = False
+# Where workers and status polls look up the capture queue: 'main.queues.DatabaseQueue' reads it straight from
+# the database; 'main.queues.RedisQueue' mirrors it into Redis, with the database remaining the source of truth.
+CAPTURE_QUEUE_BACKEND = 'main.queues.DatabaseQueue'
+CAPTURE_QUEUE_REDIS_URL = CELERY_BROKER_URL
+CAPTURE_QUEUE_REDIS_KEY_PREFIX = 'capture-queue'
+# The share of claims, across all capture workers, reserved for the head of the robot queue, so that sustained
+# human traffic can't starve it: for instance, 0.1 sends every tenth claim to the robot queue, if it has jobs waiting.
+# None (the default) always puts human jobs first.
+ROBOT_CAPTURE_JOB_SHARE = None
 
 # Webhooks
 DISPATCH_WEBHOOKS = True
@@ -9,7 +9,7 @@ DEBUG = True
 CELERY_TASK_ALWAYS_EAGER = True
 
 from celery.schedules import crontab
-CELERY_BEAT_SCHEDULE = {
+CELERY_BEAT_SCHEDULE.update({
     'demo-scheduled-task': {
         'task': 'main.tasks.demo_scheduled_task',
         'schedule': crontab(minute='*'),
@@ -18,11 +18,19 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'main.tasks.clean_up_all_expired_archives',
         'schedule': crontab(minute='*/15'),
     },
-}
+})
 CELERY_TASK_ROUTES['main.tasks.demo_scheduled_task'] = {'queue': 'background'}
 CELERY_TASK_ROUTES['main.tasks.dispatch_webhook'] = {'queue': 'background'}
 CELERY_TASK_ROUTES['main.tasks.clean_up_all_expired_archives'] = {'queue': 'background'}
 CELERY_TASK_ROUTES['main.tasks.clean_up_archive'] = {'queue': 'background'}
+CELERY_TASK_ROUTES['main.tasks.reconcile_capture_queue'] = {'queue': 'background'}
+CELERY_TASK_ROUTES['main.tasks.clean_up_failed_captures'] = {'queue': 'background'}
+CELERY_TASK_ROUTES['main.tasks.finalize_capture'] = {'queue': 'finalize'}
+
+# Scoop writes its output to a shared tmpfs volume: see docker-compose.yml
+SCOOP_OUTPUT_VOLUME = f"{os.environ.get('HOST_DIRECTORY', 'perma-capture')}_scoop_output"
+SCOOP_OUTPUT_VOLUME_LOCAL_PATH = '/app/scoop-output'
+CAPTURE_DEFERRED_FINALIZATION = True
 
 # don't check password quality locally, since it's annoying
 AUTH_PASSWORD_VALIDATORS = []
@@ -17,9 +17,16 @@ LAUNCH_CAPTURE_JOBS = False
 WEBHOOK_MAX_RETRIES = 1
 
 DEFAULT_S3_STORAGE['bucket_name'] += '-test'
+CAPTURE_QUEUE_REDIS_KEY_PREFIX += '-test'
 
 SCOOP_DOCKER_NETWORK = f"{os.environ.get('HOST_DIRECTORY')}_capture-target"
 TEST_CAPTURE_TARGET_DOMAINS = os.environ.get('TEST_CAPTURE_TARGET_DOMAINS').split(',')
 
 # Don't block anything
 SCOOP_CUSTOM_BLOCKLIST = ","
+
+# Create a fresh container for each capture, so tests can check that they are cleaned up
+SCOOP_CONTAINER_POOL_SIZE = 0
+
+# Finalize captures inline, as in production, unless a test opts into handing them off to finalize_capture
+CAPTURE_DEFERRED_FINALIZATION = False
@@ -3,7 +3,6 @@ from collections import defaultdict
 from contextlib import contextmanager
 from datetime import timezone as tz, timedelta
 from distutils.sysconfig import get_python_lib
-import docker
 import factory
 from factory.django import DjangoModelFactory
 from factory.faker import faker
@@ -24,6 +23,8 @@ from django.utils import timezone
 from django.db.backends import utils as django_db_utils
 
 from main.models import User, WebhookSubscription, Archive, CaptureJob
+from main.containers import get_docker_client, close_docker_client
+from main.queues import get_capture_queue
 from fabfile import prepare_scoop
 
 # This file defines test fixtures available to all tests.
@@ -45,6 +46,25 @@ def pytest_addoption(parser):
         action='store_true',
         help="Tests that compare to files on disk should instead update those files"
     )
+    parser.addoption(
+        "--run-slow",
+        default=False,
+        action='store_true',
+        help="Also run tests marked slow, like benchmarks and checks against very large tables"
+    )
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "slow: skipped unless --run-slow is given")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--run-slow"):
+        return
+    skip_slow = pytest.mark.skip(reason="slow: use --run-slow to run")
+    for item in items:
+        if 'slow' in item.keywords:
+            item.add_marker(skip_slow)
 
 
 ### internal helpers ###
@@ -231,12 +251,25 @@ def celery_config():
     }
 
 
+@pytest.fixture(params=['main.queues.DatabaseQueue', 'main.queues.RedisQueue'])
+def capture_queue(request, settings, db, mocker):
+    """
+    Run a test once with each capture queue backend, starting with an empty queue.
+    """
+    settings.CAPTURE_QUEUE_BACKEND = request.param
+    # the test's transaction never commits, so don't wait for it to add jobs to the queue
+    mocker.patch('main.queues.transaction.on_commit', side_effect=lambda func, using=None: func())
+    queue = get_capture_queue()
+    queue.reconcile()
+    return queue
+
+
 @pytest.fixture(scope='session')
 def docker_client():
-    client = docker.from_env()
+    client = get_docker_client()
     prepare_scoop(client, settings.SCOOP_BUILD_CONTEXT, settings.SCOOP_IMAGE, testing=True)
     yield client
-    client.close()
+    close_docker_client()
 
 
 ### model factories ###
@@ -469,6 +502,53 @@ class NoSignalsArchiveFactory(ArchiveFactory):
     pass
 
 
+@pytest.fixture
+def historical_capture_jobs_factory(db):
+    """
+    Return a function that seeds the database with a large number of finished capture jobs and their archives,
+    directly in SQL, for checking how queries hold up as history accumulates. Most archives have already been
+    cleaned up; the most recent ones are still downloadable.
+    """
+    def func(count=1000000, user=None):
+        if user is None:
+            user = UserFactory()
+        with connections['default'].cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO {CaptureJob._meta.db_table} (
+                    created_at, updated_at, status, step_count, capture_start_time, capture_end_time,
+                    requested_url, validated_url, human, "order",
+                    include_raw_exchanges, include_screenshot, include_pdf_snapshot, include_dom_snapshot,
+                    include_videos_as_attachment, include_certificates_as_attachment, run_site_specific_behaviors, headless,
+                    user_id
+                )
+                SELECT
+                    now() - make_interval(secs => %(count)s - n), now() - make_interval(secs => %(count)s - n),
+                    CASE WHEN n %% 10 = 0 THEN 'failed' ELSE 'completed' END, 7,
+                    now() - make_interval(secs => %(count)s - n), now() - make_interval(secs => %(count)s - n),
+                    'https://example.com/' || n, 'https://example.com/' || n, n %% 3 = 0, n,
+                    false, true, false, false, true, true, true, true,
+                    %(user_id)s
+                FROM generate_series(1, %(count)s) AS n
+            """, {'count': count, 'user_id': user.id})
+            cursor.execute(f"""
+                INSERT INTO {Archive._meta.db_table} (
+                    created_at, updated_at, hash, hash_algorithm, size, download_url, download_expiration_timestamp,
+                    datapackage, datapackage_digest, summary, capture_software, partial_capture, capture_job_id
+                )
+                SELECT
+                    capture_end_time, capture_end_time, md5(id::text), 'md5', 100000,
+                    CASE WHEN capture_end_time > now() - make_interval(mins => %(expires_after)s) THEN 'https://our-cloud-storage.com/' || id || '.wacz' END,
+                    capture_end_time + make_interval(mins => %(expires_after)s),
+                    '{{}}', md5(id::text), '{{}}', 'Scoop', false, id
+                FROM {CaptureJob._meta.db_table}
+                WHERE status = 'completed'
+            """, {'expires_after': settings.ARCHIVE_EXPIRES_AFTER_MINUTES})
+            cursor.execute(f"ANALYZE {CaptureJob._meta.db_table}")
+            cursor.execute(f"ANALYZE {Archive._meta.db_table}")
+        return user
+    return func
+
+
 # I'm defining this at the top-level scope so that it can be imported and used
 # outside of the contexts of tests, for instance, in local development.
 def create_capture_job(status=None, **kwargs):
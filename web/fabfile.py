@@ -88,10 +88,10 @@ def prepare_scoop(docker_client, path, tag, testing=False):
 
 
 @task()
+@setup_django
 def set_up_scoop(path, tag, testing=False):
-    docker_client = docker.from_env()
-    prepare_scoop(docker_client, path, tag, testing)
-    docker_client.close()
+    from main.containers import get_docker_client  # noqa
+    prepare_scoop(get_docker_client(), path, tag, testing)
 
 
 @task(alias='run')
@@ -107,7 +107,7 @@ def run_django(port=None):  # pragma: no cover
     if settings.CELERY_TASK_ALWAYS_EAGER:
         local(f'python manage.py runserver {port}')
     else:
-        with open_subprocess("watchmedo auto-restart -d ./ -p '*.py' -R -- celery -A config.celery.app worker --loglevel=info -Q celery,background -B -n w1@%h"):
+        with open_subprocess("watchmedo auto-restart -d ./ -p '*.py' -R -- celery -A config.celery.app worker --loglevel=info -Q celery,background,finalize -B -n w1@%h"):
             local(f'python manage.py runserver {port}')
 
 @task()
@@ -184,6 +184,10 @@ class CustomUserAdmin(UserAdmin):
             'is_active',
             'email_confirmed'
         )}),
+        ('Capture Queue', {'fields': (
+            'capture_weight',
+            'max_concurrent_captures'
+        )}),
     )
     add_fieldsets = (
         (None, {
@@ -233,7 +237,9 @@ class CaptureJobAdmin(admin.ModelAdmin):
         'created_at',
         'updated_at',
         'queue_time',
-        'capture_time'
+        'capture_time',
+        'peak_memory_bytes',
+        'cpu_seconds'
     )
     list_filter = [
         UserEmailFilter,
@@ -263,7 +269,8 @@ class CaptureJobAdmin(admin.ModelAdmin):
                 'headless'
             )}
         ),
-        ('Progress', {'fields': ( 'status', 'message', 'order', 'step_count', 'step_description', 'created_at', 'updated_at', 'capture_start_time', 'capture_end_time')})
+        ('Progress', {'fields': ( 'status', 'message', 'order', 'step_count', 'step_description', 'created_at', 'updated_at', 'capture_start_time', 'capture_end_time')}),
+        ('Resource usage', {'fields': ('peak_memory_bytes', 'cpu_seconds', 'network_rx_bytes', 'network_tx_bytes', 'block_read_bytes', 'block_write_bytes')})
     )
     readonly_fields = (
         'user_link',
@@ -286,7 +293,13 @@ class CaptureJobAdmin(admin.ModelAdmin):
         'created_at',
         'updated_at',
         'capture_start_time',
-        'capture_end_time'
+        'capture_end_time',
+        'peak_memory_bytes',
+        'cpu_seconds',
+        'network_rx_bytes',
+        'network_tx_bytes',
+        'block_read_bytes',
+        'block_write_bytes'
     )
     inlines = [ArchiveInline]
 
@@ -0,0 +1,989 @@
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+import docker
+import heapq
+import io
+import itertools
+import json
+import requests
+import shlex
+import socket
+import tarfile
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+#
+# Docker client
+#
+# Each process shares a single Docker client, so captures don't each pay for connecting to Docker and negotiating
+# an API version. Celery worker processes set theirs up on worker_process_init: see main.tasks.
+#
+
+_docker_client = None
+_docker_client_checked_at = 0
+_docker_client_lock = threading.Lock()
+
+
+def get_docker_client():
+    """
+    Return this process's Docker client, reconnecting if it fails a health check.
+    Health checks happen at most every settings.DOCKER_CLIENT_HEALTH_CHECK_SECONDS.
+
+    >>> client = get_docker_client()
+    >>> assert get_docker_client() is client
+
+    >>> mocker = getfixture('mocker')
+    >>> broken_client = mocker.Mock(**{'ping.side_effect': requests.exceptions.ConnectionError})
+    >>> _ = mocker.patch('main.containers._docker_client', broken_client)
+    >>> _ = mocker.patch('main.containers._docker_client_checked_at', 0)
+    >>> assert get_docker_client() is not broken_client
+    >>> assert broken_client.close.called
+    """
+    global _docker_client, _docker_client_checked_at
+    with _docker_client_lock:
+        now = time.monotonic()
+        if _docker_client and now - _docker_client_checked_at > settings.DOCKER_CLIENT_HEALTH_CHECK_SECONDS:
+            try:
+                _docker_client.ping()
+            except (docker.errors.APIError, requests.exceptions.RequestException):
+                logger.warning("Docker client failed its health check: reconnecting.")
+                _close_docker_client()
+            _docker_client_checked_at = now
+        if not _docker_client:
+            _docker_client = docker.from_env(max_pool_size=settings.DOCKER_CLIENT_MAX_POOL_SIZE)
+            _docker_client_checked_at = now
+        return _docker_client
+
+
+def reset_docker_client():
+    """
+    Forget any Docker client inherited from a parent process, without closing its connections,
+    which the parent may still be using.
+    """
+    global _docker_client
+    with _docker_client_lock:
+        _docker_client = None
+
+
+def close_docker_client():
+    with _docker_client_lock:
+        _close_docker_client()
+
+
+def _close_docker_client():
+    global _docker_client
+    if _docker_client:
+        try:
+            _docker_client.close()
+        except Exception:
+            pass
+        _docker_client = None
+
+
+#
+# Container watcher
+#
+# Rather than tying up a thread per capture in container.wait(), each process follows the Docker events API,
+# in a single thread, for the deaths, OOM kills and signals of the containers it is watching, and enforces
+# their timeouts from a single timer thread.
+#
+
+_container_watcher = None
+_container_watcher_lock = threading.Lock()
+
+
+def get_container_watcher():
+    """
+    Return this process's container watcher, starting it if need be.
+    """
+    global _container_watcher
+    with _container_watcher_lock:
+        if not _container_watcher:
+            _container_watcher = ContainerWatcher()
+            _container_watcher.start()
+        return _container_watcher
+
+
+def reset_container_watcher():
+    """
+    Forget any container watcher inherited from a parent process: its threads don't survive forking.
+    """
+    global _container_watcher
+    with _container_watcher_lock:
+        _container_watcher = None
+
+
+def stop_container_watcher():
+    global _container_watcher
+    with _container_watcher_lock:
+        if _container_watcher:
+            _container_watcher.stop()
+            _container_watcher = None
+
+
+class ContainerExit:
+    """
+    How a watched container exited, once it has: see ContainerWatcher.watch.
+    """
+    def __init__(self, container):
+        self.container = container
+        self.exited = threading.Event()
+        self.exit_code = None
+        self.oom_killed = False
+        self.signal = None
+        self.timedout = False
+        self.timer = None
+
+    def wait(self, timeout=None):
+        """
+        Wait up to `timeout` seconds for the container to exit, returning whether it has. If no event
+        has arrived by then, ask Docker directly, in case we missed it.
+        """
+        if not self.exited.wait(timeout):
+            self.check()
+        return self.exited.is_set()
+
+    def check(self):
+        try:
+            self.container.reload()
+        except docker.errors.NotFound:
+            self.resolve(None)
+            return
+        except (docker.errors.APIError, requests.exceptions.RequestException):
+            return
+        state = self.container.attrs['State']
+        if state['Status'] in ('exited', 'dead'):
+            self.oom_killed = self.oom_killed or state.get('OOMKilled', False)
+            self.resolve(state.get('ExitCode'))
+
+    def resolve(self, exit_code):
+        if not self.exited.is_set():
+            self.exit_code = exit_code
+            self.exited.set()
+
+
+class ContainerTimer:
+    def __init__(self, deadline, func, args):
+        self.deadline = deadline
+        self.func = func
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class ContainerWatcher:
+    """
+    Follow the Docker events API for the containers we're watching, reporting how each exits.
+
+    Given:
+    >>> mocker = getfixture('mocker')
+    >>> watcher = ContainerWatcher()
+
+    Events are dispatched to the watched container they concern; others are ignored.
+    >>> exit = ContainerExit(mocker.Mock(id='abc'))
+    >>> watcher.watched['abc'] = exit
+    >>> watcher.handle({'id': 'xyz', 'Action': 'die', 'Actor': {'Attributes': {'exitCode': '0'}}})
+    >>> assert not exit.exited.is_set()
+    >>> watcher.handle({'id': 'abc', 'Action': 'oom', 'Actor': {'Attributes': {}}})
+    >>> watcher.handle({'id': 'abc', 'Action': 'kill', 'Actor': {'Attributes': {'signal': '9'}}})
+    >>> watcher.handle({'id': 'abc', 'Action': 'die', 'Actor': {'Attributes': {'exitCode': '137'}}})
+    >>> assert exit.wait(0)
+    >>> (exit.exit_code, exit.oom_killed, exit.signal)
+    (137, True, '9')
+
+    Containers are signalled from threads of their own, so a slow Docker daemon doesn't hold up other timers.
+    >>> docker_responding = threading.Event()
+    >>> exit = ContainerExit(mocker.Mock(**{'kill.side_effect': lambda **kwargs: docker_responding.wait(10)}))
+    >>> start = time.monotonic()
+    >>> watcher.time_out(exit, grace_period=60)
+    >>> assert exit.timedout and time.monotonic() - start < 1
+    >>> docker_responding.set()
+
+    Once started, it reports containers' exits as they happen...
+    >>> docker_client = getfixture('docker_client')
+    >>> watcher.start()
+    >>> container = create_scoop_container(docker_client, ['sh', '-c', 'sleep 1; exit 3'])
+    >>> container.start()
+    >>> exit = watcher.watch(container)
+    >>> assert exit.wait(10) and exit.exit_code == 3 and not exit.timedout
+    >>> container.remove(force=True)
+
+    ...and stops containers that outlive their timeouts.
+    >>> container = create_scoop_container(docker_client, ['sleep', '60'])
+    >>> container.start()
+    >>> exit = watcher.watch(container, timeout=0, grace_period=1)
+    >>> assert exit.wait(10) and exit.timedout and exit.exit_code != 0
+    >>> watcher.unwatch(exit)
+    >>> container.remove(force=True)
+    >>> watcher.stop()
+    """
+
+    EVENTS = ['die', 'oom', 'kill']
+
+    def __init__(self):
+        self.watched = {}
+        self.timers = []
+        self.timer_sequence = itertools.count()
+        self.lock = threading.Lock()
+        self.timers_changed = threading.Condition(self.lock)
+        self.stopping = threading.Event()
+        self.events = None
+        self.threads = [
+            threading.Thread(target=self.follow_events, name="container-events", daemon=True),
+            threading.Thread(target=self.run_timers, name="container-timers", daemon=True),
+        ]
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        with self.lock:
+            self.timers_changed.notify()
+        if self.events:
+            self.events.close()
+
+    def watch(self, container, timeout=None, grace_period=0):
+        """
+        Start watching a started container, returning a ContainerExit to wait on. If it is still running after
+        `timeout` seconds, it is sent SIGTERM, and, if it is still running `grace_period` seconds after that, killed.
+        """
+        exit = ContainerExit(container)
+        with self.lock:
+            self.watched[container.id] = exit
+        if timeout is not None:
+            exit.timer = self.call_later(timeout, self.time_out, exit, grace_period)
+        # in case it exited before we started watching
+        exit.check()
+        return exit
+
+    def unwatch(self, exit):
+        with self.lock:
+            self.watched.pop(exit.container.id, None)
+        if exit.timer:
+            exit.timer.cancel()
+
+    def time_out(self, exit, grace_period):
+        if exit.exited.is_set():
+            return
+        exit.timedout = True
+        # Docker calls can block, so don't hold up other containers' timers
+        threading.Thread(target=self.stop_container, args=(exit, grace_period), name="container-stop", daemon=True).start()
+
+    def stop_container(self, exit, grace_period):
+        try:
+            exit.container.kill(signal='SIGTERM')
+        except docker.errors.APIError:
+            return
+        exit.timer = self.call_later(grace_period, self.kill, exit)
+
+    def kill(self, exit):
+        if not exit.exited.is_set():
+            threading.Thread(target=self.kill_container, args=(exit,), name="container-kill", daemon=True).start()
+
+    def kill_container(self, exit):
+        try:
+            exit.container.kill()
+        except docker.errors.APIError:
+            pass
+
+    def call_later(self, delay, func, *args):
+        """
+        Call func(*args) in the timer thread after `delay` seconds, unless the returned timer is cancelled first.
+        Timers share a single thread, so func mustn't block.
+        """
+        timer = ContainerTimer(time.monotonic() + delay, func, args)
+        with self.lock:
+            heapq.heappush(self.timers, (timer.deadline, next(self.timer_sequence), timer))
+            self.timers_changed.notify()
+        return timer
+
+    def run_timers(self):
+        while not self.stopping.is_set():
+            with self.lock:
+                while self.timers and self.timers[0][2].cancelled:
+                    heapq.heappop(self.timers)
+                if not self.timers:
+                    self.timers_changed.wait()
+                    continue
+                delay = self.timers[0][0] - time.monotonic()
+                if delay > 0:
+                    self.timers_changed.wait(delay)
+                    continue
+                _, _, timer = heapq.heappop(self.timers)
+            try:
+                timer.func(*timer.args)
+            except Exception:
+                logger.exception("Exception in container timer:")
+
+    def follow_events(self):
+        since = None
+        reconnecting = False
+        while not self.stopping.is_set():
+            try:
+                self.events = get_docker_client().events(
+                    decode=True,
+                    since=since,
+                    filters={'type': 'container', 'event': self.EVENTS}
+                )
+                if reconnecting:
+                    # catch up on anything the replayed events don't cover
+                    with self.lock:
+                        exits = list(self.watched.values())
+                    for exit in exits:
+                        exit.check()
+                for event in self.events:
+                    since = event.get('time', since)
+                    self.handle(event)
+            except Exception:
+                if not self.stopping.is_set():
+                    logger.warning("Lost the Docker events stream: reconnecting.", exc_info=True)
+            reconnecting = True
+            self.stopping.wait(1)
+
+    def handle(self, event):
+        with self.lock:
+            exit = self.watched.get(event.get('id'))
+        if not exit:
+            return
+        action = event.get('Action')
+        attributes = event.get('Actor', {}).get('Attributes', {})
+        if action == 'oom':
+            exit.oom_killed = True
+        elif action == 'kill':
+            exit.signal = attributes.get('signal')
+        elif action == 'die':
+            exit_code = attributes.get('exitCode')
+            exit.resolve(int(exit_code) if exit_code is not None else None)
+
+
+#
+# Container stats
+#
+
+_one_shot_stats = True
+
+
+def get_container_stats(container):
+    """
+    Return a single reading of a container's stats. One-shot readings come back straight away, rather than
+    waiting a couple of seconds for a second sample to work out CPU percentages, but need Docker API 1.41:
+    on older APIs, fall back to the usual readings.
+
+    >>> mocker = getfixture('mocker')
+    >>> _ = mocker.patch('main.containers._one_shot_stats', True)
+    >>> container = mocker.Mock(**{'stats.side_effect': [docker.errors.InvalidVersion('one_shot is not supported'), {'read': 1}, {'read': 2}]})
+    >>> get_container_stats(container), get_container_stats(container)
+    ({'read': 1}, {'read': 2})
+    >>> [call.kwargs for call in container.stats.call_args_list]
+    [{'stream': False, 'one_shot': True}, {'stream': False}, {'stream': False}]
+    """
+    global _one_shot_stats
+    if _one_shot_stats:
+        try:
+            return container.stats(stream=False, one_shot=True)
+        except docker.errors.InvalidVersion:
+            _one_shot_stats = False
+    return container.stats(stream=False)
+
+
+class ContainerStatsSampler(threading.Thread):
+    """
+    Sample a container's stats every `interval` seconds until stopped, to find the resources used by a capture:
+    see stop(). Counters are measured from the container's start or, with `from_first_sample=True` (for Scoop
+    servers, which run one capture after another), from the first sample. Peak memory is the most seen in any
+    sample, not counting the inactive page cache, as `docker stats` reports it.
+
+    >>> mocker = getfixture('mocker')
+    >>> def stats(memory, cpu, rx, written):
+    ...     return {
+    ...         'memory_stats': {'usage': memory, 'stats': {'inactive_file': 1000}},
+    ...         'cpu_stats': {'cpu_usage': {'total_usage': cpu * 10**9}},
+    ...         'networks': {'eth0': {'rx_bytes': rx, 'tx_bytes': 10}},
+    ...         'blkio_stats': {'io_service_bytes_recursive': [{'op': 'read', 'value': 0}, {'op': 'write', 'value': written}]},
+    ...     }
+    >>> container = mocker.Mock(**{'stats.side_effect': [stats(5000, 10, 100, 0), stats(9000, 12, 300, 50), stats(6000, 15, 400, 80), {'memory_stats': {}}]})
+
+    >>> sampler = ContainerStatsSampler(container, interval=0, from_first_sample=True)
+    >>> for _ in range(4):
+    ...     sampler.sample()
+    >>> sampler.usage()
+    {'peak_memory_bytes': 8000, 'cpu_seconds': 5.0, 'network_rx_bytes': 300, 'network_tx_bytes': 0, 'block_read_bytes': 0, 'block_write_bytes': 80}
+
+    With no usable samples, there's nothing to report.
+    >>> ContainerStatsSampler(container, interval=0).usage()
+    {}
+    """
+
+    def __init__(self, container, interval, from_first_sample=False):
+        self.container = container
+        self.interval = interval
+        self.from_first_sample = from_first_sample
+        self.baseline = None
+        self.latest = None
+        self.peak_memory_bytes = None
+        self.stopping = threading.Event()
+        super().__init__(name="container-stats", daemon=True)
+
+    def run(self):
+        while True:
+            self.sample()
+            if self.stopping.wait(self.interval):
+                break
+
+    def stop(self):
+        """
+        Stop sampling, and return the resources used: see usage().
+        """
+        self.stopping.set()
+        if self.is_alive():
+            self.join()
+        self.sample()
+        return self.usage()
+
+    def sample(self):
+        try:
+            stats = get_container_stats(self.container)
+        except (docker.errors.APIError, requests.exceptions.RequestException):
+            return
+        memory = stats.get('memory_stats')
+        if not memory:
+            # the container has stopped
+            return
+        memory_stats = memory.get('stats', {})
+        in_use = memory.get('usage', 0) - memory_stats.get('total_inactive_file', memory_stats.get('inactive_file', 0))
+        self.peak_memory_bytes = max(self.peak_memory_bytes or 0, in_use)
+
+        networks = (stats.get('networks') or {}).values()
+        block_io = stats.get('blkio_stats', {}).get('io_service_bytes_recursive') or []
+        counters = {
+            'cpu_seconds': stats.get('cpu_stats', {}).get('cpu_usage', {}).get('total_usage', 0) / 10**9,
+            'network_rx_bytes': sum(network.get('rx_bytes', 0) for network in networks),
+            'network_tx_bytes': sum(network.get('tx_bytes', 0) for network in networks),
+            'block_read_bytes': sum(entry['value'] for entry in block_io if entry.get('op', '').lower() == 'read'),
+            'block_write_bytes': sum(entry['value'] for entry in block_io if entry.get('op', '').lower() == 'write'),
+        }
+        if self.baseline is None:
+            self.baseline = counters if self.from_first_sample else dict.fromkeys(counters, 0)
+        self.latest = counters
+
+    def usage(self):
+        """
+        Return the resources used so far, as a dict of CaptureJob field names to values, or {} if there were no samples.
+        """
+        if not self.latest:
+            return {}
+        return {
+            'peak_memory_bytes': self.peak_memory_bytes,
+            **{name: value - self.baseline[name] for name, value in self.latest.items()}
+        }
+
+
+#
+# Scoop containers
+#
+# Creating and starting a container is a noticeable part of every capture, so each worker host keeps a
+# warm pool of started, idle Scoop containers, waiting to be handed a command. Each is used for a single
+# capture and then removed, just like a container created for the job.
+#
+
+POOL_LABEL = 'perma-capture.scoop-pool'
+# which worker node created an idle container: the pool is shared, but each node only drains its own
+POOL_NODE_LABEL = 'perma-capture.scoop-pool.node'
+IDLE_NAME_PREFIX = 'scoop-pool-idle-'
+SERVER_LABEL = 'perma-capture.scoop-server'
+
+# Pooled containers wait for their Scoop command to be handed over as a file, one argument per line,
+# and then replace themselves with it: from then on, they behave just like a container created with
+# that command. (The arguments are never interpreted by the shell.)
+LAUNCHER = """
+until [ -f /tmp/scoop-command-ready ]; do sleep 0.1; done
+set --
+while IFS= read -r arg; do set -- "$@" "$arg"; done < /tmp/scoop-command
+rm -f /tmp/scoop-command /tmp/scoop-command-ready
+exec "$@"
+"""
+
+
+# Where settings.SCOOP_OUTPUT_VOLUME, if any, is mounted in Scoop containers
+SCOOP_OUTPUT_MOUNT = '/output'
+
+
+def create_scoop_container(client, command, **kwargs):
+    if settings.SCOOP_OUTPUT_VOLUME:
+        kwargs['volumes'] = {settings.SCOOP_OUTPUT_VOLUME: {'bind': SCOOP_OUTPUT_MOUNT, 'mode': 'rw'}}
+    return client.containers.create(
+        settings.SCOOP_IMAGE,
+        shm_size='1GB',
+        mem_limit='4GB',
+        init=True,
+        command=command,
+        detach=True,
+        network=settings.SCOOP_DOCKER_NETWORK or '',
+        **kwargs
+    )
+
+
+def get_scoop_container_pool():
+    return _get_scoop_container_pool(settings.SCOOP_CONTAINER_POOL_SIZE, settings.SCOOP_CONTAINER_POOL_MAX_AGE_SECONDS)
+
+
+@lru_cache(maxsize=None)
+def _get_scoop_container_pool(size, max_age):
+    return ScoopContainerPool(size, max_age)
+
+
+class ScoopContainerPool:
+    """
+    A pool of idle Scoop containers, shared by all the worker processes using the same Docker daemon.
+    Worker processes take containers by renaming them, which Docker does atomically, so each is only used once.
+
+    Given:
+    >>> docker_client, django_settings = [getfixture(i) for i in ['docker_client', 'settings']]
+    >>> pool = ScoopContainerPool(size=2, max_age=60)
+
+    The pool fills itself up in the background, when asked...
+    >>> pool.refill()
+    >>> assert len(pool.idle_containers(docker_client)) == 2
+
+    ...and hands out ready containers, running the given command.
+    >>> container = pool.start_container(docker_client, 'echo "Ready to scoop!"')
+    >>> assert container.wait()['StatusCode'] == 0
+    >>> assert container.logs() == b'Ready to scoop!\\n'
+    >>> container.remove(force=True)
+    >>> pool.refilling.join()
+    >>> assert len(pool.idle_containers(docker_client)) == 2
+
+    Containers that have sat idle for too long are retired, instead of being handed out.
+    >>> pool.max_age = 0
+    >>> container = pool.start_container(docker_client, 'echo "Ready to scoop!"')
+    >>> assert not container.name.startswith(IDLE_NAME_PREFIX) and container.wait()['StatusCode'] == 0
+    >>> container.remove(force=True)
+    >>> pool.refilling.join()
+    >>> pool.max_age = 60
+
+    Idle containers are taken by name, so once one worker has taken a container, no other can.
+    >>> container, stale_listing = pool.idle_containers(docker_client)[0], pool.idle_containers(docker_client)[0]
+    >>> assert pool.take(docker_client, container, f'scoop-pool-busy-{uuid.uuid4().hex}')
+    >>> assert not pool.take(docker_client, stale_listing, f'scoop-pool-discarding-{uuid.uuid4().hex}')
+    >>> container.remove(force=True)
+
+    Each worker node only drains the idle containers it created, leaving those of other nodes on the same host.
+    >>> other_node_container = create_scoop_container(docker_client, ['sleep', '60'], name=f'{IDLE_NAME_PREFIX}{uuid.uuid4().hex}', labels={POOL_LABEL: '', POOL_NODE_LABEL: 'other-node'})
+    >>> other_node_container.start()
+    >>> pool.drain()
+    >>> assert [container.id for container in pool.idle_containers(docker_client)] == [other_node_container.id]
+    >>> other_node_container.remove(force=True)
+
+    If the pool is empty, or disabled, we create a container from scratch.
+    >>> assert not pool.idle_containers(docker_client)
+    >>> pool.size = 0
+    >>> container = pool.start_container(docker_client, 'echo "Ready to scoop!"')
+    >>> assert container.wait()['StatusCode'] == 0
+    >>> container.remove(force=True)
+    >>> pool.refill()
+    >>> assert not pool.idle_containers(docker_client)
+    """
+
+    def __init__(self, size, max_age):
+        self.size = size
+        self.max_age = max_age
+        self.refill_lock = threading.Lock()
+        self.refilling = None
+
+    def idle_containers(self, client):
+        return client.containers.list(filters={'label': POOL_LABEL, 'name': IDLE_NAME_PREFIX})
+
+    def is_usable(self, container):
+        """
+        Check that an idle container is still waiting for a command, is reported healthy by Docker,
+        and hasn't been sitting around for longer than max_age seconds.
+        """
+        state = container.attrs['State']
+        if state['Status'] != 'running' or state.get('Health', {}).get('Status') == 'unhealthy':
+            return False
+        started_at = datetime.fromisoformat(state['StartedAt'][:19]).replace(tzinfo=timezone.utc)
+        return datetime.now(timezone.utc) - started_at < timedelta(seconds=self.max_age)
+
+    def start_container(self, client, command):
+        """
+        Return a started container running `command`, from the pool if possible,
+        and top up the pool in the background.
+        """
+        args = shlex.split(command)
+        container = None
+        if self.size:
+            for idle_container in self.idle_containers(client):
+                if not self.is_usable(idle_container):
+                    self.retire(client, idle_container)
+                    continue
+                if not self.take(client, idle_container, f'scoop-pool-busy-{uuid.uuid4().hex}'):
+                    # another worker got here first
+                    continue
+                try:
+                    self.hand_over(idle_container, args)
+                except Exception:
+                    self.discard(idle_container)
+                    raise
+                container = idle_container
+                break
+            self.refill_async()
+
+        if not container:
+            container = create_scoop_container(client, args)
+            container.start()
+        return container
+
+    def hand_over(self, container, args):
+        """
+        Pass a command to an idle container. The "ready" file is written after the command,
+        so the container never sees a partial command.
+        """
+        assert not any('\n' in arg for arg in args), "Scoop arguments must not contain newlines."
+        with io.BytesIO() as tar_file:
+            with tarfile.open(fileobj=tar_file, mode='w') as tar:
+                for name, contents in [('scoop-command', '\n'.join(args) + '\n'), ('scoop-command-ready', '')]:
+                    data = contents.encode('utf-8')
+                    info = tarfile.TarInfo(name)
+                    info.size = len(data)
+                    tar.addfile(info, io.BytesIO(data))
+            container.put_archive('/tmp', tar_file.getvalue())
+        container.reload()
+
+    def take(self, client, container, new_name):
+        """
+        Rename an idle container, addressing it by its idle name rather than its id, so that only one worker
+        process can take it: once it has been renamed, its idle name no longer exists. Returns whether we got it.
+        """
+        try:
+            client.api.rename(container.name, new_name)
+        except docker.errors.APIError:
+            return False
+        container.reload()
+        return True
+
+    def retire(self, client, container):
+        """
+        Remove an idle container, unless another worker has taken it since it was listed.
+        """
+        if self.take(client, container, f'scoop-pool-discarding-{uuid.uuid4().hex}'):
+            self.discard(container)
+
+    def discard(self, container):
+        try:
+            container.remove(force=True)
+        except docker.errors.APIError:
+            pass
+
+    def refill_async(self):
+        self.refilling = threading.Thread(target=self.refill, name="scoop-pool-refill", daemon=True)
+        self.refilling.start()
+
+    def refill(self):
+        """
+        Retire any unusable or surplus idle containers, and create enough new ones to make up the pool.
+        Only one thread per process refills at a time; others return straight away.
+        """
+        if not self.refill_lock.acquire(blocking=False):
+            return
+        client = get_docker_client()
+        try:
+            idle_containers = []
+            for container in self.idle_containers(client):
+                if self.is_usable(container):
+                    idle_containers.append(container)
+                else:
+                    self.retire(client, container)
+            # other worker processes may have been refilling at the same time
+            for container in idle_containers[self.size:]:
+                self.retire(client, container)
+            for _ in range(self.size - len(idle_containers)):
+                container = create_scoop_container(
+                    client,
+                    ['sh', '-c', LAUNCHER],
+                    name=f'{IDLE_NAME_PREFIX}{uuid.uuid4().hex}',
+                    labels={POOL_LABEL: '', POOL_NODE_LABEL: socket.gethostname()},
+                    healthcheck={
+                        # check that Node can load Scoop and its dependencies, not just that they're there
+                        'test': ['CMD', 'node', '-e', "import('@harvard-lil/scoop').catch(() => process.exit(1))"],
+                        'interval': 30 * 10**9,
+                        'timeout': 10 * 10**9,
+                    }
+                )
+                container.start()
+        except Exception:
+            logger.exception("Exception while refilling the Scoop container pool:")
+        finally:
+            self.refill_lock.release()
+
+    def drain(self):
+        """
+        Remove the idle containers this worker node created: for instance, when it shuts down. Other nodes
+        sharing the Docker host keep theirs.
+        """
+        client = get_docker_client()
+        for container in client.containers.list(all=True, filters={
+            'label': [POOL_LABEL, f'{POOL_NODE_LABEL}={socket.gethostname()}'],
+            'name': IDLE_NAME_PREFIX
+        }):
+            self.retire(client, container)
+
+
+#
+# Scoop servers
+#
+# Alternatively, each worker process can keep long-lived Scoop servers running in containers of their own
+# (see docker/scoop/server.mjs), one for each capture it runs at once, and send them one capture after another,
+# so captures don't each pay for starting Node and loading Scoop.
+#
+
+_scoop_servers = set()
+_idle_scoop_servers = []
+_scoop_servers_lock = threading.Lock()
+
+
+def get_scoop_server(client):
+    """
+    Take one of this worker process's idle Scoop servers, starting a new one if there isn't a healthy one idle.
+    Servers do one capture at a time, so captures running at once (see settings.CAPTURE_CONCURRENCY) each
+    get a server of their own. Hand it back with recycle_scoop_server().
+
+    Given:
+    >>> mocker = getfixture('mocker')
+    >>> for method in ['start', 'remove']:
+    ...     _ = mocker.patch.object(ScoopServer, method)
+    >>> _ = mocker.patch.object(ScoopServer, 'is_running', return_value=True)
+    >>> _ = mocker.patch.object(ScoopServer, 'needs_recycling', return_value=False)
+
+    Captures running at the same time get different servers...
+    >>> first, second = get_scoop_server(None), get_scoop_server(None)
+    >>> assert first is not second
+
+    ...and servers are reused once they are handed back.
+    >>> recycle_scoop_server(first)
+    >>> assert get_scoop_server(None) is first
+    >>> recycle_scoop_server(first, force=True)
+    >>> recycle_scoop_server(second)
+    >>> remove_scoop_servers()
+    >>> assert ScoopServer.remove.call_count == 2
+    """
+    while True:
+        with _scoop_servers_lock:
+            if not _idle_scoop_servers:
+                break
+            server = _idle_scoop_servers.pop()
+        if server.is_running():
+            return server
+        recycle_scoop_server(server, force=True)
+
+    server = ScoopServer(client)
+    with _scoop_servers_lock:
+        _scoop_servers.add(server)
+    try:
+        server.start()
+    except Exception:
+        recycle_scoop_server(server, force=True)
+        raise
+    return server
+
+
+def recycle_scoop_server(server, force=False):
+    """
+    Hand back a Scoop server taken with get_scoop_server(), removing it instead if it has done enough captures
+    or is using too much memory, or if `force=True`. A new one will be started when needed.
+    """
+    if force or server.needs_recycling():
+        with _scoop_servers_lock:
+            _scoop_servers.discard(server)
+        server.remove()
+    else:
+        with _scoop_servers_lock:
+            _idle_scoop_servers.append(server)
+
+
+def remove_scoop_servers():
+    """
+    Remove all of this worker process's Scoop servers: for instance, when it shuts down.
+    """
+    with _scoop_servers_lock:
+        servers = list(_scoop_servers)
+        _scoop_servers.clear()
+        _idle_scoop_servers.clear()
+    for server in servers:
+        server.remove()
+
+
+class ScoopServer:
+    """
+    A Scoop server running in a container, taking requests over a Unix socket, one at a time.
+    We talk to it with curl, via docker exec, so the worker doesn't need to share a network with it.
+
+    Given:
+    >>> docker_client, django_settings = [getfixture(i) for i in ['docker_client', 'settings']]
+
+    Servers start up and report when they are ready...
+    >>> server = ScoopServer(docker_client)
+    >>> server.start()
+    >>> assert server.is_running()
+
+    ...and are recycled after enough captures.
+    >>> django_settings.SCOOP_SERVER_MAX_CAPTURES = 1
+    >>> assert not server.needs_recycling()
+    >>> server.captures += 1
+    >>> assert server.needs_recycling()
+    >>> server.remove()
+    >>> assert not docker_client.containers.list(all=True, filters={'label': SERVER_LABEL})
+    """
+
+    SOCKET = '/tmp/scoop.sock'
+
+    def __init__(self, client):
+        self.client = client
+        self.container = None
+        self.exit = None
+        self.captures = 0
+
+    def start(self):
+        self.container = create_scoop_container(
+            self.client,
+            ['node', 'server.mjs', self.SOCKET],
+            name=f'scoop-server-{uuid.uuid4().hex}',
+            labels=[SERVER_LABEL]
+        )
+        self.container.start()
+        self.exit = get_container_watcher().watch(self.container)
+        deadline = time.monotonic() + settings.SCOOP_SERVER_STARTUP_TIMEOUT_SECONDS
+        while self.request('GET', '/health').exit_code != 0:
+            if time.monotonic() > deadline:
+                self.remove()
+                raise TimeoutError("Scoop server did not start in time.")
+            time.sleep(.5)
+
+    def request(self, method, path, data=None, stream=False, timeout=None):
+        command = ['curl', '--silent', '--show-error', '--fail', '--no-buffer', '--unix-socket', self.SOCKET, '-X', method]
+        if data is not None:
+            command += ['--data-binary', json.dumps(data)]
+        if timeout is not None:
+            command += ['--max-time', str(timeout)]
+        return self.container.exec_run(command + [f'http://scoop{path}'], stream=stream, demux=False)
+
+    def is_running(self):
+        if self.exit and self.exit.exited.is_set():
+            return False
+        try:
+            self.container.reload()
+        except docker.errors.NotFound:
+            return False
+        return self.container.status == 'running'
+
+    def needs_recycling(self):
+        if self.captures >= settings.SCOOP_SERVER_MAX_CAPTURES:
+            return True
+        try:
+            memory = get_container_stats(self.container)['memory_stats'].get('usage', 0)
+        except docker.errors.APIError:
+            return True
+        return memory > settings.SCOOP_SERVER_MAX_MEMORY_BYTES
+
+    def capture(self, url, options, timeout):
+        """
+        Start a capture, returning a ScoopServerCapture to follow its progress.
+        """
+        self.captures += 1
+        return ScoopServerCapture(self, url, options, timeout)
+
+    def clean_up(self, directory):
+        self.container.exec_run(['rm', '-rf', directory])
+
+    def remove(self):
+        if self.exit:
+            get_container_watcher().unwatch(self.exit)
+        try:
+            self.container.remove(force=True)
+        except docker.errors.APIError:
+            pass
+
+
+class ScoopServerCapture:
+    """
+    A capture in progress on a Scoop server. Iterate over it for Scoop's log lines, as bytes, interleaved with
+    its progress events, as dicts (see docker/scoop/server.mjs); once they are exhausted, `exit_code` holds
+    Scoop's exit code, or None if the capture was cut short. If the capture runs for longer than `timeout`
+    seconds, it is stopped: see stop().
+
+    >>> capture = ScoopServerCapture.__new__(ScoopServerCapture)
+    >>> capture.output, capture.watchdog = [], ContainerTimer(0, None, ())
+    >>> capture.stream = iter([b'[12:00:00] INFO  STEP [1/2]: Intercepter\\nSCOOP-EVENT {"event": "step", "nu', b'mber": 1}\\nSCOOP-EXIT 0\\n'])
+    >>> list(capture)
+    [b'[12:00:00] INFO  STEP [1/2]: Intercepter', {'event': 'step', 'number': 1}]
+    >>> capture.exit_code
+    0
+    """
+
+    EXIT_PREFIX = b'SCOOP-EXIT '
+    EVENT_PREFIX = b'SCOOP-EVENT '
+
+    def __init__(self, server, url, options, timeout):
+        self.server = server
+        self.exit_code = None
+        self.output = []
+        self.timedout = False
+        self.watchdog = get_container_watcher().call_later(timeout, self.time_out)
+        self.stream = server.request('POST', '/capture', {'url': url, 'options': options}, stream=True).output
+
+    def time_out(self):
+        self.timedout = True
+        # stopping blocks for up to the grace period, so don't hold up the watcher's other timers
+        threading.Thread(target=self.stop, args=(settings.SCOOP_STOP_GRACE_SECONDS,), name="scoop-stop", daemon=True).start()
+
+    def stop(self, grace_period):
+        """
+        Ask Scoop to stop recording and save what it has captured so far, as a partial capture, waiting up to
+        `grace_period` seconds for it to finish. If it doesn't, kill the server.
+        """
+        self.watchdog.cancel()
+        try:
+            result = self.server.request('POST', '/stop', timeout=grace_period)
+            if result.exit_code == 0 and result.output.startswith(self.EXIT_PREFIX):
+                self.exit_code = int(result.output[len(self.EXIT_PREFIX):])
+                return
+            logger.warning(f"Scoop server did not stop cleanly: {result.output!r}")
+        except docker.errors.APIError:
+            logger.warning("Scoop server did not stop cleanly.", exc_info=True)
+        self.server.remove()
+
+    def __iter__(self):
+        buffer = b''
+        try:
+            for chunk in self.stream:
+                buffer += chunk
+                *lines, buffer = buffer.split(b'\n')
+                for line in lines:
+                    if line.startswith(self.EXIT_PREFIX):
+                        self.exit_code = int(line[len(self.EXIT_PREFIX):])
+                    elif line.startswith(self.EVENT_PREFIX):
+                        try:
+                            yield json.loads(line[len(self.EVENT_PREFIX):])
+                        except ValueError:
+                            logger.warning(f"Could not parse Scoop event: {line!r}")
+                    else:
+                        self.output = (self.output + [line])[-20:]
+                        yield line
+        except docker.errors.APIError:
+            pass
+        finally:
+            self.watchdog.cancel()
+
+    @property
+    def stderr(self):
+        return str(b'\n'.join(self.output), 'utf-8', errors='replace')
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.1 on 2026-10-17 06:14
+
+from django.db import migrations, models
+
+
+def set_previous_order(apps, schema_editor):
+    """
+    Link each pending job to its user's previous pending job in the same queue.
+    """
+    CaptureJob = apps.get_model('main', 'CaptureJob')
+    last_orders = {}
+    pending_jobs = CaptureJob.objects.filter(status='pending').order_by('human', 'order').only('human', 'user_id', 'order')
+    for job in pending_jobs.iterator():
+        key = (job.human, job.user_id)
+        if key in last_orders:
+            CaptureJob.objects.filter(pk=job.pk).update(previous_order=last_orders[key])
+        last_orders[key] = job.order
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='capturejob',
+            name='previous_order',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(set_previous_order, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='capturejob',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['human', 'user', 'order'], name='pending_user_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='capturejob',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['human', 'previous_order'], name='pending_previous_order_idx'),
+        ),
+    ]
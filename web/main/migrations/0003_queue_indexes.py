@@ -0,0 +1,34 @@
+# Generated by Django 4.2.1 on 2026-10-17 06:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0002_capturejob_previous_order'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='capturejob',
+            name='order',
+            field=models.FloatField(),
+        ),
+        migrations.AddIndex(
+            model_name='archive',
+            index=models.Index(condition=models.Q(('download_url__isnull', False)), fields=['download_expiration_timestamp'], name='downloadable_expiration_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='capturejob',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['-human', 'order', 'id'], name='pending_queue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='capturejob',
+            index=models.Index(fields=['human', 'order'], name='queue_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='capturejob',
+            index=models.Index(condition=models.Q(('status', 'in_progress')), fields=['capture_start_time'], name='in_progress_start_time_idx'),
+        ),
+    ]
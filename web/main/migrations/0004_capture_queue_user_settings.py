@@ -0,0 +1,24 @@
+# Generated by Django 4.2.1 on 2026-10-17 06:22
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_queue_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='capture_weight',
+            field=models.PositiveSmallIntegerField(default=1, help_text='How many capture jobs this user gets per turn, when sharing the capture queue with other users.', validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='max_concurrent_captures',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='The most capture jobs this user may have in progress at once. Leave blank for no limit.', null=True),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.1 on 2026-10-17 06:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_capture_queue_user_settings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='capturejob',
+            name='block_read_bytes',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='capturejob',
+            name='block_write_bytes',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='capturejob',
+            name='cpu_seconds',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='capturejob',
+            name='network_rx_bytes',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='capturejob',
+            name='network_tx_bytes',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='capturejob',
+            name='peak_memory_bytes',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -1,4 +1,4 @@
-import itertools
+import json
 import time
 import urllib.parse
 
@@ -9,14 +9,16 @@ from django.conf import settings
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.contrib.auth.tokens import default_token_generator
 from django.core.exceptions import ObjectDoesNotExist
-from django.db import models
-from django.db.models.functions import Now
+from django.core.validators import MinValueValidator
+from django.db import connection, models, transaction
+from django.db.models.functions import Coalesce, Now
 from django.db.models.query import QuerySet
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_encode
 
+from .queues import get_capture_queue, get_robot_claim_share
 from .storages import get_screenshot_storage, screenshot_directory
 from .utils import send_template_email, generate_hmac_signing_key
 
@@ -203,18 +205,64 @@ class Job(TimestampedModel):
     capture_start_time = models.DateTimeField(blank=True, null=True)
     capture_end_time = models.DateTimeField(blank=True, null=True)
 
+    def mark_started(self):
+        """
+        Record the start time of this job, using database time so timeout comparisons will be consistent across workers.
+        """
+        self.capture_start_time = Now()
+        self.save(update_fields=['capture_start_time', 'updated_at'])
+        self.refresh_from_db(fields=['capture_start_time'])
+
     def inc_progress(self, inc, description):
+        """
+        Count progress in memory, saving it at most every settings.CAPTURE_PROGRESS_SAVE_INTERVAL_MS: a busy
+        capture can log many milestones a second. Progress not yet saved is saved with the job's final status.
+
+        Given:
+        >>> job, django_settings = [getfixture(i) for i in ['pending_capture_job', 'settings']]
+        >>> django_settings.CAPTURE_PROGRESS_SAVE_INTERVAL_MS = 60 * 1000
+
+        The first step is saved straight away, but later ones wait...
+        >>> job.inc_progress(1, 'one')
+        >>> job.inc_progress(1, 'two')
+        >>> assert CaptureJob.objects.get(pk=job.pk).step_description == 'one'
+
+        ...until the interval has passed, or progress is saved explicitly...
+        >>> job.save_progress()
+        >>> assert CaptureJob.objects.get(pk=job.pk).step_description == 'two'
+
+        ...or the job is done.
+        >>> job.inc_progress(1, 'three')
+        >>> job.mark_completed()
+        >>> assert CaptureJob.objects.get(pk=job.pk).step_description == 'three'
+        """
         self.step_count = int(self.step_count) + inc
         self.step_description = description
+        self._unsaved_progress = True
+        self.save_progress(force=False)
+
+    def save_progress(self, force=True):
+        """
+        Save any progress counted by inc_progress but not yet saved; unless forced, only if
+        settings.CAPTURE_PROGRESS_SAVE_INTERVAL_MS has passed since progress was last saved.
+        """
+        if not getattr(self, '_unsaved_progress', False):
+            return
+        now = time.monotonic()
+        if not force and (now - getattr(self, '_progress_saved_at', float('-inf'))) * 1000 < settings.CAPTURE_PROGRESS_SAVE_INTERVAL_MS:
+            return
         self.save(update_fields=['step_count', 'step_description', 'updated_at'])
+        self._unsaved_progress = False
+        self._progress_saved_at = now
 
     def mark_completed(self, status=Status.COMPLETED):
         """
-        Record completion time and status for this job.
+        Record completion time and status for this job, along with any progress not yet saved.
         """
         self.status = status
         self.capture_end_time = Now()
-        self.save(update_fields=['status', 'message', 'capture_end_time', 'updated_at'])
+        self.save(update_fields=['status', 'message', 'capture_end_time', 'step_count', 'step_description', 'updated_at'])
+        self._unsaved_progress = False
 
     def mark_failed(self, message):
         """
@@ -247,6 +295,29 @@ class Job(TimestampedModel):
     capture_time.short_description = 'capture time (s)'
 
 
+class CaptureJobQuerySet(QuerySet):
+    def with_queue_position(self):
+        """
+        Annotate each job with its queue position (see CaptureJob.queue_position), so that listing
+        many jobs takes a single query, rather than one or two queries per job.
+        """
+        pending_jobs = CaptureJob.objects.filter(status=Job.Status.PENDING).order_by()
+        jobs_ahead_in_queue = Coalesce(models.Subquery(
+            pending_jobs.filter(
+                human=models.OuterRef('human'),
+                order__lte=models.OuterRef('order')
+            ).values('status').annotate(count=models.Count('pk')).values('count')
+        ), 0)
+        human_jobs = Coalesce(models.Subquery(
+            pending_jobs.filter(human=True).values('status').annotate(count=models.Count('pk')).values('count')
+        ), 0)
+        return self.annotate(annotated_queue_position=models.Case(
+            models.When(status=Job.Status.PENDING, human=True, then=jobs_ahead_in_queue),
+            models.When(status=Job.Status.PENDING, then=jobs_ahead_in_queue + human_jobs),
+            default=models.Value(0)
+        ))
+
+
 class CaptureJob(Job):
     """
     Metadata about capture jobs requested by a user.
@@ -261,7 +332,11 @@ class CaptureJob(Job):
 
     # Record whether a human is actively awaiting the results of the job; may influence queue order.
     human = models.BooleanField(default=False)
-    order = models.FloatField(db_index=True)
+    order = models.FloatField()
+    # The order of the pending job submitted `user.capture_weight` jobs earlier (usually, the previous job) by the
+    # same user to the same queue, if any, at the time this job was created.
+    # Used to find fair queue positions for new jobs: see get_fair_queue_position.
+    previous_order = models.FloatField(blank=True, null=True)
 
     # Options
     include_raw_exchanges = models.BooleanField(default=False)
@@ -276,12 +351,35 @@ class CaptureJob(Job):
     # capture-window-x
     # capture-window-y
 
+    # Resources used by the capture's Scoop container, sampled from its Docker stats; see ContainerStatsSampler.
+    # Used to size containers and worker concurrency.
+    peak_memory_bytes = models.BigIntegerField(blank=True, null=True)
+    cpu_seconds = models.FloatField(blank=True, null=True)
+    network_rx_bytes = models.BigIntegerField(blank=True, null=True)
+    network_tx_bytes = models.BigIntegerField(blank=True, null=True)
+    block_read_bytes = models.BigIntegerField(blank=True, null=True)
+    block_write_bytes = models.BigIntegerField(blank=True, null=True)
+
     user = models.ForeignKey(
         'User',
         on_delete=models.PROTECT,
         related_name='capture_jobs'
     )
 
+    objects = CaptureJobQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # claim jobs in queue order, and count jobs ahead in line; see claim_jobs_from_db and queue_position
+            models.Index(fields=['-human', 'order', 'id'], condition=models.Q(status='pending'), name='pending_queue_idx'),
+            # support fair queue placement for new jobs; see get_fair_queue_position
+            models.Index(fields=['human', 'user', 'order'], condition=models.Q(status='pending'), name='pending_user_order_idx'),
+            models.Index(fields=['human', 'previous_order'], condition=models.Q(status='pending'), name='pending_previous_order_idx'),
+            models.Index(fields=['human', 'order'], name='queue_order_idx'),
+            # find timed-out captures; see clean_up_failed_captures
+            models.Index(fields=['capture_start_time'], condition=models.Q(status='in_progress'), name='in_progress_start_time_idx'),
+        ]
+
     def __str__(self):
         return f"CaptureJob {self.pk}"
 
@@ -291,92 +389,270 @@ class CaptureJob(Job):
 
     def save(self, *args, **kwargs):
 
-        # If this job does not have an order yet (just created),
-        # examine all pending jobs to place this one in a fair position in the queue.
+        # If this job does not have an order yet (just created), place it in a fair position in the queue.
         # "Fair" means round robin: this job will be processed after every other job submitted by this user,
         # and then after every other user waiting in line has had at least one job done.
-        if not self.order:
-
-            # get all pending jobs, in reverse priority order
-            pending_jobs = CaptureJob.objects.filter(status=CaptureJob.Status.PENDING, human=self.human).order_by('-order')
-            # narrow down to just the jobs that come *after* the most recent job submitted by this user
-            pending_jobs = list(itertools.takewhile(lambda x: x.user_id != self.user_id, pending_jobs))
-            # flip the list of jobs back around to the order they'll be processed in
-            pending_jobs = list(reversed(pending_jobs))
-
-            # Go through pending jobs until we find two jobs submitted by the same user.
-            # It's not fair for another user to run two jobs after all of ours are done,
-            # so this new job should come right before that user's second job.
-            next_jobs = {}
-            last_job = None
-            for pending_job in pending_jobs:
-                pending_job_user_id = pending_job.user_id
-                if pending_job_user_id in next_jobs:
-                    # pending_job is the other user's second job, so this one goes in between that and last_job
-                    self.order = last_job.order + (pending_job.order - last_job.order)/2
-                    break
-                next_jobs[pending_job_user_id] = pending_job
-                last_job = pending_job
-
-            # If order isn't set yet, that means we should go last. Find the highest current order and add 1.
-            if not self.order:
-                if pending_jobs:
-                    self.order = pending_jobs[-1].order + 1
-                else:
-                    self.order = (CaptureJob.objects.filter(human=self.human).aggregate(models.Max('order'))['order__max'] or 0) + 1
+        enqueue = not self.order
+        if enqueue:
+            self.order, self.previous_order = self.get_fair_queue_position()
 
         super().save(*args, **kwargs)
 
+        if enqueue and self.status == CaptureJob.Status.PENDING:
+            get_capture_queue().add_jobs([self])
+
+    def get_fair_queue_position(self):
+        """
+        Return an (order, previous_order) pair placing this job fairly in its queue.
+
+        Pending jobs in a queue always form "rounds": every user with pending jobs has one job in the first round,
+        every user with at least two pending jobs has one job in the second round, and so on, with users appearing
+        in the same relative order in every round. A new job belongs in the round after this user's most recent
+        pending job, right before the first job in that round from a user who comes after this user in line.
+        Users with a `capture_weight` greater than 1 get that many consecutive jobs per round, instead of one.
+
+        Each job records the order of the job its user submitted `capture_weight` pending jobs earlier (usually,
+        the previous one) in `previous_order`, so that spot can be found without walking the queue: it is the
+        first pending job whose `previous_order` comes after that job of this user's (or, if this user doesn't
+        have that many pending jobs, the first pending job whose `previous_order` refers to a job that is itself
+        still pending). That takes a fixed number of indexed queries, however long the queue is.
+
+        >>> user_one, user_two, user_three = [getfixture('user_factory')() for _ in range(3)]
+        >>> assert_num_queries = getfixture('assert_num_queries')
+        >>> job_factory = getfixture('pending_capture_job_factory')
+        >>> for user in (user_one, user_one, user_one, user_two, user_two):
+        ...     _ = job_factory(user=user)
+
+        A user who already has jobs in line waits for a round: three queries, however long the queue.
+        >>> with assert_num_queries(select=3, insert=1):
+        ...     job = job_factory(user=user_two)
+        >>> assert job.queue_position() == 6
+
+        A user with nothing in line joins the end of the first round: two queries.
+        >>> with assert_num_queries(select=2, insert=1):
+        ...     job = job_factory(user=user_three)
+        >>> assert job.queue_position() == 3
+
+        A user with a weight of 2 gets two turns per round.
+        >>> weighted_user = getfixture('user_factory')(capture_weight=2)
+        >>> jobs = [job_factory(user=weighted_user) for _ in range(3)]
+        >>> assert [job.queue_position() for job in jobs] == [4, 5, 8]
+        """
+        pending_jobs = CaptureJob.objects.filter(status=CaptureJob.Status.PENDING, human=self.human)
+
+        # find this user's most recent pending job (or, for weighted users, the one `capture_weight` jobs back), if any
+        weight = self.user.capture_weight
+        previous_order = next(iter(
+            pending_jobs.filter(user_id=self.user_id).order_by('-order').values_list('order', flat=True)[weight - 1:weight]
+        ), None)
+
+        # find the first job of a user who has already had a turn since this user's previous turn: one whose own
+        # previous job is still pending (jobs aren't always claimed in order, so that has to be checked directly,
+        # for instance when users at their concurrent capture limits are skipped over)
+        next_jobs = pending_jobs.filter(models.Exists(
+            pending_jobs.filter(user_id=models.OuterRef('user_id'), order=models.OuterRef('previous_order'))
+        ))
+        if previous_order is not None:
+            next_jobs = next_jobs.filter(previous_order__gt=previous_order)
+        next_order = next_jobs.order_by('order').values_list('order', flat=True).first()
+
+        if next_order is not None:
+            # this job goes in between that job and the one right before it
+            last_order = pending_jobs.filter(order__lt=next_order).order_by('-order').values_list('order', flat=True).first()
+            return last_order + (next_order - last_order)/2, previous_order
+
+        # Otherwise, we should go last. Find the highest current order and add 1.
+        max_order = CaptureJob.objects.filter(human=self.human).order_by('-order').values_list('order', flat=True).first() or 0
+        return max_order + 1, previous_order
+
+
 
     @classmethod
     def get_next_job(cls, reserve=False):
         """
-        Return the next job to work on, looking first at the human queue and then at the robot queue.
+        Return the next job to work on, looking first at the human queue and then at the robot queue
+        (except for any claims reserved for the robot queue: see claim_jobs).
         If `reserve=True`, mark the returned job with `status=in_progress` and remove from queue so the
         same job can't be returned twice. Caller must make sure the job is actually processed once returned.
         """
+        if not reserve:
+            return cls.pending_jobs_in_queue_order().first()
 
-        while True:
-            next_job = cls.objects.filter(status=cls.Status.PENDING).order_by('-human', 'order', 'pk').first()
+        jobs = cls.claim_jobs(1)
+        return jobs[0] if jobs else None
 
-            if reserve and next_job:
-                if cls.TEST_PAUSE_TIME:
-                    time.sleep(cls.TEST_PAUSE_TIME)
+    @classmethod
+    def pending_jobs_in_queue_order(cls):
+        """
+        Pending jobs, in the order they will be worked on: the human queue, then the robot queue.
+        """
+        return cls.objects.filter(status=cls.Status.PENDING).order_by('-human', 'order', 'pk')
 
-                # update the returned job to be in_progress instead of pending, so it won't be returned again
-                # set time using database time, so timeout comparisons will be consistent across worker servers
-                update_count = cls.objects.filter(
-                    status=cls.Status.PENDING,
-                    pk=next_job.pk
-                ).update(
-                    status=cls.Status.IN_PROGRESS,
-                    capture_start_time=Now()
-                )
+    @classmethod
+    def claim_jobs(cls, count):
+        """
+        Reserve up to `count` of the next jobs to work on, in queue order, marking them `status=in_progress`
+        so they can't be returned twice. Caller must make sure each job is either processed or handed back
+        with release_jobs.
 
-                # if no rows were updated, another worker claimed this job already -- try again
-                if not update_count and not cls.TEST_ALLOW_RACE:
-                    continue
+        A share of claims, settings.ROBOT_CAPTURE_JOB_SHARE, may be reserved for the head of the robot queue,
+        so that sustained human traffic can't starve it.
 
-                # load up-to-date time from database
-                next_job.refresh_from_db()
+        Claims are served by the configured capture queue backend: see main.queues.
+        """
+        return get_capture_queue().claim_jobs(count, robot_count=get_robot_claim_share().reserve(count))
 
-            return next_job
+    @classmethod
+    def claim_jobs_from_db(cls, count, pks=None, human=None):
+        """
+        Claim up to `count` pending jobs straight from the database, in queue order,
+        optionally only considering the jobs with the given primary keys, or in the given queue.
+
+        Claiming locks the jobs' rows with SELECT ... FOR UPDATE SKIP LOCKED, so concurrent workers each
+        skip past rows that others are in the middle of claiming, rather than all contending for the head
+        of the queue and retrying.
+
+        Jobs belonging to users who already have `max_concurrent_captures` jobs in progress are skipped,
+        so fewer than `count` jobs may be returned even if more are pending.
+        """
+        with transaction.atomic():
+            next_jobs = cls.pending_jobs_in_queue_order()
+            if pks is not None:
+                next_jobs = next_jobs.filter(pk__in=pks)
+            if human is not None:
+                next_jobs = next_jobs.filter(human=human)
+
+            # skip users who already have as many captures in progress as they are allowed
+            users_at_limit = User.objects.filter(max_concurrent_captures__isnull=False).annotate(
+                in_progress=models.Count('capture_jobs', filter=models.Q(capture_jobs__status=cls.Status.IN_PROGRESS))
+            ).filter(in_progress__gte=models.F('max_concurrent_captures')).values('pk')
+            next_jobs = next_jobs.exclude(user_id__in=users_at_limit)
+
+            if not cls.TEST_ALLOW_RACE:
+                next_jobs = next_jobs.select_for_update(skip_locked=True, of=('self',))
+
+            # Fetch database time along with the jobs: it is fixed for the whole transaction, so it
+            # matches the capture_start_time set below without reloading the jobs afterwards.
+            jobs = list(next_jobs.annotate(
+                claimed_at=Now(),
+                user_max_concurrent_captures=models.F('user__max_concurrent_captures')
+            )[:count])
+
+            # Don't let a batch take any user over their limit, either. Lock those users' rows, so that
+            # concurrent claims for the same user take turns counting that user's captures in progress.
+            limited_user_ids = {job.user_id for job in jobs if job.user_max_concurrent_captures is not None}
+            if limited_user_ids:
+                list(User.objects.select_for_update(no_key=True).filter(pk__in=limited_user_ids).order_by('pk').values_list('pk'))
+                in_progress = dict(cls.objects.filter(user_id__in=limited_user_ids, status=cls.Status.IN_PROGRESS).values(
+                    'user_id'
+                ).annotate(count=models.Count('pk')).values_list('user_id', 'count'))
+                claimable_jobs = []
+                for job in jobs:
+                    if job.user_max_concurrent_captures is not None:
+                        if in_progress.get(job.user_id, 0) >= job.user_max_concurrent_captures:
+                            continue
+                        in_progress[job.user_id] = in_progress.get(job.user_id, 0) + 1
+                    claimable_jobs.append(job)
+                jobs = claimable_jobs
+
+            if not jobs:
+                return []
+
+            if cls.TEST_PAUSE_TIME:
+                time.sleep(cls.TEST_PAUSE_TIME)
+
+            # update the returned jobs to be in_progress instead of pending, so they won't be returned again
+            # set time using database time, so timeout comparisons will be consistent across worker servers
+            cls.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                status=cls.Status.IN_PROGRESS,
+                capture_start_time=Now()
+            )
+
+        for job in jobs:
+            job.status = cls.Status.IN_PROGRESS
+            job.capture_start_time = job.claimed_at
+        return jobs
+
+    @classmethod
+    def fail_timed_out_jobs(cls, timeout, message):
+        """
+        Mark failed, in a single UPDATE, any jobs that have been in progress for longer than `timeout` seconds
+        (as measured by the database clock, so it's consistent across workers).
+        Returns a list of (id, user_id, capture_start_time) for the jobs affected.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                UPDATE {cls._meta.db_table}
+                SET status = %s, message = %s, capture_end_time = now(), updated_at = now()
+                WHERE status = %s AND capture_start_time < now() - make_interval(secs => %s)
+                RETURNING id, user_id, capture_start_time
+            """, [
+                cls.Status.FAILED,
+                json.dumps({api_settings.NON_FIELD_ERRORS_KEY: [message]}),
+                cls.Status.IN_PROGRESS,
+                timeout
+            ])
+            return cursor.fetchall()
+
+    @classmethod
+    def release_jobs(cls, jobs):
+        """
+        Return claimed jobs that were never started to the queue. They keep their `order`,
+        so they go back to the same place in line.
+        """
+        cls.objects.filter(pk__in=[job.pk for job in jobs], status=cls.Status.IN_PROGRESS).update(
+            status=cls.Status.PENDING,
+            capture_start_time=None
+        )
+        for job in jobs:
+            job.status = cls.Status.PENDING
+            job.capture_start_time = None
+        get_capture_queue().add_jobs(jobs)
 
     def queue_position(self):
         """
-        Search job_queues to calculate the queue position for this job -- how many pending jobs have to be processed
+        Calculate the queue position for this job -- how many pending jobs have to be processed
         before this one?
         Returns 0 if job is not pending.
+        Uses the value calculated by CaptureJob.objects.with_queue_position(), if available;
+        otherwise, asks the configured capture queue backend.
+
+        Users' capture weights are built into the queue order, so are reflected here; limits on concurrent
+        captures are not, so jobs from users at their limit may wait longer than their position suggests.
+        Nor are claims reserved for the robot queue, so robot jobs may start sooner than their position suggests.
         """
+        if hasattr(self, 'annotated_queue_position'):
+            return self.annotated_queue_position
+
         if self.status != CaptureJob.Status.PENDING:
             return 0
 
+        return get_capture_queue().queue_position(self)
+
+    def queue_position_from_db(self):
+        """
+        Count the pending jobs that have to be processed before this one, straight from the database.
+        """
         queue_position = CaptureJob.objects.filter(status=Job.Status.PENDING, order__lte=self.order, human=self.human).count()
         if not self.human:
             queue_position += CaptureJob.objects.filter(status=Job.Status.PENDING, human=True).count()
 
         return queue_position
 
+    def record_resource_usage(self, usage):
+        """
+        Save the resources used by this job's capture, given a dict of field names to values.
+
+        >>> capture_job = getfixture('in_progress_capture_job_factory')()
+        >>> capture_job.record_resource_usage({'peak_memory_bytes': 512 * 1024 ** 2, 'cpu_seconds': 12.5})
+        >>> capture_job.refresh_from_db()
+        >>> assert (capture_job.peak_memory_bytes, capture_job.cpu_seconds) == (512 * 1024 ** 2, 12.5)
+        """
+        for field, value in usage.items():
+            setattr(self, field, value)
+        if usage:
+            self.save(update_fields=list(usage))
+
     def mark_completed(self, status=Job.Status.COMPLETED):
         """
         Record completion time and status for this job.
@@ -386,6 +662,34 @@ class CaptureJob(Job):
             status = CaptureJob.Status.FAILED
         super().mark_completed(status)
 
+    def mark_completed_if_in_progress(self):
+        """
+        Mark this job completed, unless it's no longer in progress: for instance, because it was failed
+        for taking too long while its artifacts were being saved (see fail_timed_out_jobs).
+        Returns whether the job was marked completed.
+
+        Given:
+        >>> in_progress_capture_job_factory, archive_factory = [getfixture(i) for i in ['in_progress_capture_job_factory', 'archive_factory']]
+
+        >>> job = in_progress_capture_job_factory()
+        >>> _ = archive_factory(capture_job=job, create_capture_job=False)
+        >>> assert job.mark_completed_if_in_progress()
+        >>> job.refresh_from_db()
+        >>> assert job.status == CaptureJob.Status.COMPLETED
+
+        >>> job = in_progress_capture_job_factory()
+        >>> CaptureJob.objects.filter(pk=job.pk).update(status=CaptureJob.Status.FAILED)
+        1
+        >>> assert not job.mark_completed_if_in_progress()
+        >>> assert job.status == CaptureJob.Status.FAILED
+        """
+        with transaction.atomic():
+            self.status = CaptureJob.objects.select_for_update().values_list('status', flat=True).get(pk=self.pk)
+            if self.status != CaptureJob.Status.IN_PROGRESS:
+                return False
+            self.mark_completed()
+            return True
+
 
 class ArchiveQuerySet(QuerySet):
     def expired(self):
@@ -422,6 +726,12 @@ class Archive(TimestampedModel):
 
     objects = ArchiveQuerySet.as_manager()
 
+    class Meta:
+        indexes = [
+            # find archives to clean up; see ArchiveQuerySet.expired
+            models.Index(fields=['download_expiration_timestamp'], condition=models.Q(download_url__isnull=False), name='downloadable_expiration_idx'),
+        ]
+
     @property
     def filename(self):
         return f"job-{self.capture_job.id}-{urllib.parse.urlparse(self.capture_job.validated_url).netloc.replace('.', '-')}.wacz"
@@ -527,6 +837,18 @@ class User(EditTrackedModel, TimestampedModel, PermissionsMixin, AbstractBaseUse
     deactivated_date = models.DateTimeField(blank=True, null=True)
     email_confirmed = models.BooleanField(default=False)
 
+    # capture queue settings
+    capture_weight = models.PositiveSmallIntegerField(
+        default=1,
+        validators=[MinValueValidator(1)],
+        help_text="How many capture jobs this user gets per turn, when sharing the capture queue with other users."
+    )
+    max_concurrent_captures = models.PositiveSmallIntegerField(
+        blank=True,
+        null=True,
+        help_text="The most capture jobs this user may have in progress at once. Leave blank for no limit."
+    )
+
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['first_name', 'last_name']
 
@@ -0,0 +1,328 @@
+from functools import lru_cache
+import redis
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+#
+# Capture queue backends
+#
+# The database is always the source of truth for which capture jobs are pending, and in what order:
+# see CaptureJob.get_fair_queue_position. A backend decides how workers and status polls find that out.
+#
+
+def get_capture_queue():
+    return _get_capture_queue(settings.CAPTURE_QUEUE_BACKEND)
+
+
+@lru_cache(maxsize=None)
+def _get_capture_queue(backend):
+    return import_string(backend)()
+
+
+class DatabaseQueue:
+    """
+    Serve the capture queue straight from the database.
+    """
+
+    def add_jobs(self, jobs):
+        """
+        Note that these jobs are pending. (The database already knows.)
+        """
+        pass
+
+    def claim_jobs(self, count, robot_count=0):
+        """
+        Claim up to `count` jobs, taking the first `robot_count` from the head of the robot queue, if it has any.
+        """
+        from .models import CaptureJob
+        jobs = CaptureJob.claim_jobs_from_db(robot_count, human=False) if robot_count else []
+        if len(jobs) < count:
+            jobs += CaptureJob.claim_jobs_from_db(count - len(jobs))
+        return jobs
+
+    def queue_position(self, job):
+        return job.queue_position_from_db()
+
+    def queue_depth(self, human):
+        from .models import CaptureJob
+        return CaptureJob.objects.filter(status=CaptureJob.Status.PENDING, human=human).count()
+
+    def reconcile(self):
+        """
+        Repair any drift from the database, returning a count of (added, removed) jobs.
+        """
+        return (0, 0)
+
+
+class RedisQueue(DatabaseQueue):
+    """
+    Mirror the order of pending capture jobs into Redis sorted sets, one for the human queue and one for
+    the robot queue, so that claims, queue positions and queue depths don't have to hit the database.
+
+    The mirror is allowed to drift: jobs are only added once the transaction saving them has committed, and jobs
+    popped from Redis are only claimed if the database agrees they are still pending. Claims don't fall back to
+    the database when Redis comes up short, so that idle workers polling an empty queue don't query it; instead,
+    reconcile() (run periodically by the reconcile_capture_queue task) brings the sorted sets back in line.
+    """
+
+    # Pop up to ARGV[1] job ids, trying each key in turn, returning each id along with its score and the
+    # (1-based) index of its key, so that jobs that can't be claimed can be put back where they were.
+    POP_SCRIPT = """
+        local count = tonumber(ARGV[1])
+        local found = 0
+        local popped = {}
+        for index, key in ipairs(KEYS) do
+            if found >= count then
+                break
+            end
+            local members = redis.call('ZPOPMIN', key, count - found)
+            for i = 1, #members, 2 do
+                table.insert(popped, members[i])
+                table.insert(popped, members[i + 1])
+                table.insert(popped, index)
+                found = found + 1
+            end
+        end
+        return popped
+    """
+
+    def __init__(self, url=None, key_prefix=None):
+        self.redis = redis.from_url(url or settings.CAPTURE_QUEUE_REDIS_URL)
+        self.key_prefix = key_prefix or settings.CAPTURE_QUEUE_REDIS_KEY_PREFIX
+        self.pop = self.redis.register_script(self.POP_SCRIPT)
+
+    def key(self, human):
+        return f"{self.key_prefix}:{'human' if human else 'robot'}"
+
+    def add_jobs(self, jobs):
+        """
+        Add jobs to their sorted sets, once the current transaction (if any) commits: workers treat jobs they
+        pop but can't see in the database as no longer pending.
+        """
+        scores = [(self.key(job.human), job.pk, job.order) for job in jobs]
+        transaction.on_commit(lambda: self.add_scores(scores))
+
+    def add_scores(self, scores):
+        """
+        Add jobs to the sorted sets, given (key, pk, score) tuples.
+        """
+        if not scores:
+            return
+        pipeline = self.redis.pipeline()
+        for key, pk, score in scores:
+            pipeline.zadd(key, {pk: score})
+        pipeline.execute()
+
+    def claim_jobs(self, count, robot_count=0):
+        jobs = self.claim_popped_jobs(robot_count, [self.key(False)]) if robot_count else []
+        if len(jobs) < count:
+            jobs += self.claim_popped_jobs(count - len(jobs), [self.key(True), self.key(False)])
+        return jobs
+
+    def claim_popped_jobs(self, count, keys):
+        """
+        Pop up to `count` job ids from the given keys, in turn, and claim them.
+        """
+        from .models import CaptureJob
+
+        # job id -> (key, score)
+        result = self.pop(keys=keys, args=[count])
+        popped = {int(pk): (keys[int(index) - 1], float(score)) for pk, score, index in zip(result[::3], result[1::3], result[2::3])}
+        if not popped:
+            return []
+        jobs = CaptureJob.claim_jobs_from_db(len(popped), pks=list(popped))
+        if len(jobs) < len(popped):
+            # Put back any jobs that couldn't be claimed, unless the database says they are no longer pending:
+            # their users may be at their concurrent capture limits, or another worker may have their rows locked.
+            unclaimed_pks = set(popped) - {job.pk for job in jobs}
+            finished_pks = set(CaptureJob.objects.filter(pk__in=unclaimed_pks).exclude(
+                status=CaptureJob.Status.PENDING
+            ).values_list('pk', flat=True))
+            self.add_scores([(popped[pk][0], pk, popped[pk][1]) for pk in unclaimed_pks - finished_pks])
+            if finished_pks:
+                logger.info(f"Capture queue drift: {len(finished_pks)} jobs in Redis were no longer pending.")
+        return jobs
+
+    def remove_jobs(self, jobs):
+        pipeline = self.redis.pipeline()
+        for job in jobs:
+            pipeline.zrem(self.key(job.human), job.pk)
+        pipeline.execute()
+
+    def queue_position(self, job):
+        pipeline = self.redis.pipeline()
+        pipeline.zrank(self.key(job.human), job.pk)
+        pipeline.zcard(self.key(True))
+        rank, human_jobs = pipeline.execute()
+        if rank is None:
+            return super().queue_position(job)
+        return rank + 1 + (0 if job.human else human_jobs)
+
+    def queue_depth(self, human):
+        return self.redis.zcard(self.key(human))
+
+    def reconcile(self):
+        from .models import CaptureJob
+
+        added = removed = 0
+        for human in (True, False):
+            key = self.key(human)
+            pending_jobs = dict(CaptureJob.objects.filter(status=CaptureJob.Status.PENDING, human=human).values_list('pk', 'order'))
+            mirrored_jobs = {int(pk): score for pk, score in self.redis.zrange(key, 0, -1, withscores=True)}
+
+            missing = {pk: order for pk, order in pending_jobs.items() if mirrored_jobs.get(pk) != order}
+            stale = [pk for pk in mirrored_jobs if pk not in pending_jobs]
+
+            pipeline = self.redis.pipeline()
+            if missing:
+                pipeline.zadd(key, missing)
+            if stale:
+                pipeline.zrem(key, *stale)
+            pipeline.execute()
+            added += len(missing)
+            removed += len(stale)
+        return (added, removed)
+
+
+#
+# Robot queue share
+#
+# Human jobs go first, so, under sustained human traffic, the robot queue could wait forever. Optionally, a share
+# of all claims, across all workers, is reserved for the head of the robot queue: see settings.ROBOT_CAPTURE_JOB_SHARE.
+#
+
+def get_robot_claim_share():
+    return _get_robot_claim_share(settings.CAPTURE_QUEUE_REDIS_URL, settings.CAPTURE_QUEUE_REDIS_KEY_PREFIX)
+
+
+@lru_cache(maxsize=None)
+def _get_robot_claim_share(url, key_prefix):
+    return RobotClaimShare(url, key_prefix)
+
+
+class RobotClaimShare:
+    """
+    Count claims in Redis, reserving settings.ROBOT_CAPTURE_JOB_SHARE of them for the robot queue.
+
+    >>> django_settings = getfixture('settings')
+    >>> share = get_robot_claim_share()
+    >>> share.reset()
+    >>> django_settings.ROBOT_CAPTURE_JOB_SHARE = None
+    >>> share.reserve(10)
+    0
+    >>> django_settings.ROBOT_CAPTURE_JOB_SHARE = 0.25
+    >>> [share.reserve(1) for _ in range(8)]
+    [0, 0, 0, 1, 0, 0, 0, 1]
+    >>> share.reserve(8)
+    2
+    >>> share.reset()
+    """
+
+    def __init__(self, url=None, key_prefix=None):
+        self.redis = redis.from_url(url or settings.CAPTURE_QUEUE_REDIS_URL)
+        self.key = f"{key_prefix or settings.CAPTURE_QUEUE_REDIS_KEY_PREFIX}:claims"
+
+    def reserve(self, count):
+        """
+        Count `count` claims, returning how many of them are reserved for the robot queue.
+        """
+        share = settings.ROBOT_CAPTURE_JOB_SHARE
+        if not share or not count:
+            return 0
+        claims = self.redis.incrby(self.key, count)
+        return int(claims * share) - int((claims - count) * share)
+
+    def reset(self):
+        self.redis.delete(self.key)
+
+
+#
+# Capture worker wakeups
+#
+# Each run_next_capture task queues up its own successor until it finds the queue empty, so there's no point
+# in having more of them queued or running than there are capture workers to run them: see wake_capture_workers.
+#
+
+def get_capture_worker_tokens():
+    return _get_capture_worker_tokens(settings.CAPTURE_QUEUE_REDIS_URL, settings.CAPTURE_QUEUE_REDIS_KEY_PREFIX)
+
+
+@lru_cache(maxsize=None)
+def _get_capture_worker_tokens(url, key_prefix):
+    return CaptureWorkerTokens(url, key_prefix)
+
+
+class CaptureWorkerTokens:
+    """
+    Count the run_next_capture tasks queued or running, in Redis, allowing at most settings.CAPTURE_WORKER_COUNT.
+
+    If a wakeup is turned away because all the tokens are taken, we note it, so that the next worker to find
+    the queue empty takes another look, rather than standing down just as new jobs arrive.
+
+    The count expires if no run_next_capture task has started for a while, in case tasks were lost
+    without returning their tokens.
+    """
+
+    ACQUIRE_SCRIPT = """
+        local limit, wanted, ttl = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+        local held = tonumber(redis.call('GET', KEYS[1]) or '0')
+        local granted = math.max(0, math.min(wanted, limit - held))
+        redis.call('SET', KEYS[1], held + granted, 'EX', ttl)
+        if granted < wanted then
+            redis.call('SET', KEYS[2], 1, 'EX', ttl)
+        end
+        return granted
+    """
+
+    # Return 1 if the caller should keep its token and look again, because a wakeup was missed.
+    RELEASE_SCRIPT = """
+        if redis.call('DEL', KEYS[2]) == 1 then
+            return 1
+        end
+        local held = tonumber(redis.call('GET', KEYS[1]) or '0')
+        if held > 0 then
+            redis.call('DECR', KEYS[1])
+        end
+        return 0
+    """
+
+    def __init__(self, url=None, key_prefix=None):
+        self.redis = redis.from_url(url or settings.CAPTURE_QUEUE_REDIS_URL)
+        key_prefix = key_prefix or settings.CAPTURE_QUEUE_REDIS_KEY_PREFIX
+        self.keys = [f"{key_prefix}:worker-tokens", f"{key_prefix}:missed-wakeup"]
+        self._acquire = self.redis.register_script(self.ACQUIRE_SCRIPT)
+        self._release = self.redis.register_script(self.RELEASE_SCRIPT)
+
+    @property
+    def ttl(self):
+        return 2 * settings.CELERY_TASK_TIME_LIMIT
+
+    def acquire(self, count):
+        """
+        Take up to `count` tokens, returning how many were granted.
+        """
+        return self._acquire(keys=self.keys, args=[settings.CAPTURE_WORKER_COUNT, count, self.ttl])
+
+    def renew(self):
+        """
+        Note that a token holder is still at work.
+        """
+        self.redis.expire(self.keys[0], self.ttl)
+
+    def release(self):
+        """
+        Hand back a token, unless a wakeup was missed. Returns True if the caller should keep its token and carry on.
+        """
+        return bool(self._release(keys=self.keys))
+
+    def held(self):
+        return int(self.redis.get(self.keys[0]) or 0)
+
+    def reset(self):
+        self.redis.delete(*self.keys)
@@ -1,9 +1,14 @@
+from botocore.exceptions import BotoCoreError, ClientError
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from storages.backends.s3boto3 import S3Boto3Storage
+from storages.utils import clean_name
+from time import sleep
 
 from django.conf import settings
 
 # used only for suppressing INFO logging in S3Boto3Storage
 import logging
+logger = logging.getLogger(__name__)
 
 
 #
@@ -21,11 +26,87 @@ class PrivateS3Storage(S3Storage):
     default_acl = 'private'
 
 
+class MultipartS3Storage(S3Storage):
+    """
+    Upload files larger than a part in parts, `upload_concurrency` at a time, reading the file in order,
+    exactly once. Each part is kept in memory until it is uploaded, so a part that fails is retried on its own,
+    up to `upload_part_attempts` times, without starting the upload over.
+
+    At most upload_concurrency + 1 parts are held in memory at once.
+    """
+
+    def get_default_settings(self):
+        return {
+            **super().get_default_settings(),
+            'upload_part_size': settings.ARCHIVE_UPLOAD_PART_SIZE,
+            'upload_concurrency': settings.ARCHIVE_UPLOAD_CONCURRENCY,
+            'upload_part_attempts': settings.ARCHIVE_UPLOAD_PART_ATTEMPTS,
+        }
+
+    def _save(self, name, content):
+        if self.gzip or not content.size or content.size <= self.upload_part_size:
+            return super()._save(name, content)
+
+        cleaned_name = clean_name(name)
+        name = self._normalize_name(cleaned_name)
+        params = self._get_write_parameters(name, content)
+        content.seek(0)
+
+        client = self.connection.meta.client
+        upload = {'Bucket': self.bucket_name, 'Key': name}
+        upload['UploadId'] = client.create_multipart_upload(**upload, **params)['UploadId']
+        try:
+            parts = self._upload_parts(client, upload, content)
+            client.complete_multipart_upload(**upload, MultipartUpload={'Parts': parts})
+        except BaseException:
+            client.abort_multipart_upload(**upload)
+            raise
+        return cleaned_name
+
+    def _upload_parts(self, client, upload, content):
+        parts = []
+        with ThreadPoolExecutor(max_workers=self.upload_concurrency) as executor:
+            in_flight = set()
+            part_number = 1
+            while True:
+                data = self._read_part(content)
+                if not data:
+                    break
+                in_flight.add(executor.submit(self._upload_part, client, upload, part_number, data))
+                part_number += 1
+                if len(in_flight) >= self.upload_concurrency:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    parts += [future.result() for future in done]
+            parts += [future.result() for future in in_flight]
+        return sorted(parts, key=lambda part: part['PartNumber'])
+
+    def _read_part(self, content):
+        # every part but the last must be full-sized
+        data = b''
+        while len(data) < self.upload_part_size:
+            chunk = content.read(self.upload_part_size - len(data))
+            if not chunk:
+                break
+            data += chunk
+        return data
+
+    def _upload_part(self, client, upload, part_number, data):
+        for attempt in range(1, self.upload_part_attempts + 1):
+            try:
+                response = client.upload_part(**upload, PartNumber=part_number, Body=data)
+                return {'PartNumber': part_number, 'ETag': response['ETag']}
+            except (BotoCoreError, ClientError):
+                if attempt == self.upload_part_attempts:
+                    raise
+                logger.warning(f"Retrying part {part_number} of {upload['Key']} after attempt {attempt} failed.", exc_info=True)
+                sleep(2 ** attempt / 10)
+
+
 #
 # Storages
 #
 
-class ArchiveStorage(PrivateS3Storage):
+class ArchiveStorage(MultipartS3Storage, PrivateS3Storage):
     location = 'archives'
 
 
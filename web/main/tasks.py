@@ -1,27 +1,37 @@
+import asyncio
 from celery import shared_task
 from celery.exceptions import MaxRetriesExceededError, SoftTimeLimitExceeded, Retry
-from celery.signals import task_failure
+from celery.signals import task_failure, worker_process_init, worker_process_shutdown, worker_ready, worker_shutting_down
+from celery.utils.imports import symbol_by_name
+from collections import deque, namedtuple
 from datetime import timedelta
-import docker
+from functools import lru_cache
 import json
+import os
 import re
 import requests
+import shutil
+import signal
 import socket
 import threading
-from time import sleep
+from time import monotonic, sleep
 import zipfile
 
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.core.files import File
 from django.core.mail import mail_admins
+from django.db import connection
 from django.utils import timezone
 
+from .containers import (get_docker_client, reset_docker_client, close_docker_client, get_scoop_container_pool,
+    get_scoop_server, recycle_scoop_server, remove_scoop_servers, get_container_watcher, reset_container_watcher, stop_container_watcher,
+    ContainerStatsSampler, SCOOP_OUTPUT_MOUNT)
 from .models import CaptureJob, Archive, WebhookSubscription
+from .queues import get_capture_queue, get_capture_worker_tokens
 from .serializers import ReadOnlyCaptureJobSerializer, SimpleWebhookSubscriptionSerializer
 from .storages import get_archive_storage
-from .utils import (validate_and_clean_url, extract_file_from_container, extract_files_from_container,
-    get_file_hash, parse_querystring, datetime_from_timestamp, format_scoop_option, sign_data,
+from .utils import (validate_and_clean_url, extract_files_from_container, read_files_from_directory, HashingReader, parse_querystring, datetime_from_timestamp, format_scoop_option, sign_data,
     is_valid_signature, send_template_email
 )
 
@@ -77,6 +87,79 @@ The contents of the full traceback was:
     mail_admins(subject, message)
 
 
+### WORKER LIFECYCLE ###
+
+worker_shutting_down_event = threading.Event()
+capture_batch_running = threading.Event()
+
+@worker_shutting_down.connect()
+def set_worker_shutting_down(**kwargs):
+    """
+    Let batches of capture jobs know to stop starting new captures, so unstarted jobs are released to the queue,
+    and remove this host's idle Scoop containers. Celery only sends this signal in the main worker process,
+    which is where tasks run with the solo and threads pools; see handle_sigterm_in_worker_process for prefork.
+    """
+    worker_shutting_down_event.set()
+    get_scoop_container_pool().drain()
+
+
+@worker_ready.connect()
+def fill_scoop_container_pool(**kwargs):
+    """
+    Warm up this host's pool of idle Scoop containers, so the first captures don't have to wait.
+    """
+    get_scoop_container_pool().refill_async()
+
+
+@worker_process_init.connect()
+def init_docker_client(**kwargs):
+    """
+    Connect this worker process to Docker, once, rather than for every capture.
+    """
+    reset_docker_client()
+    reset_container_watcher()
+    get_docker_client()
+
+
+@worker_process_init.connect()
+def handle_sigterm_in_worker_process(**kwargs):
+    """
+    With the prefork pool, captures run in child processes, which never hear about worker_shutting_down.
+    They do get SIGTERM, when it is sent to the worker's whole process group (as process supervisors usually
+    do) or when the main process terminates them. If it arrives while a batch of captures is running, let the
+    batch know, so that it finishes the capture in progress and releases the rest to the queue. Otherwise,
+    or the second time, SIGTERM has its usual effect.
+
+    >>> previous_handler = signal.getsignal(signal.SIGTERM)
+    >>> handle_sigterm_in_worker_process()
+    >>> capture_batch_running.set()
+    >>> os.kill(os.getpid(), signal.SIGTERM)
+    >>> assert worker_shutting_down_event.is_set()
+    >>> assert signal.getsignal(signal.SIGTERM) is previous_handler
+    >>> capture_batch_running.clear()
+    >>> worker_shutting_down_event.clear()
+    """
+    previous_handler = signal.getsignal(signal.SIGTERM)
+
+    def handle_sigterm(signum, frame):
+        signal.signal(signal.SIGTERM, previous_handler)
+        worker_shutting_down_event.set()
+        if not capture_batch_running.is_set():
+            signal.raise_signal(signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
+
+
+@worker_process_shutdown.connect()
+def remove_scoop_server(**kwargs):
+    """
+    Remove this worker process's Scoop servers, if it has any, and disconnect from Docker.
+    """
+    remove_scoop_servers()
+    stop_container_watcher()
+    close_docker_client()
+
+
 ### CAPTURE HELPERS ###
 
 class HaltCaptureException(Exception):
@@ -89,66 +172,131 @@ class NoArchiveProduced(Exception):
     pass
 
 
-class ScoopLifeCycleThread(threading.Thread):
+ScoopLogEvent = namedtuple('ScoopLogEvent', ['kind', 'message'])
+
+
+class ScoopLogClassifier:
     """
+    Sort Scoop's log lines, as they arrive (in bytes), into milestones, which count as capture progress;
+    info events, which we log; and everything else, which we log at debug level, if at all. Each kind is
+    matched with a single precompiled regex, and lines are only decoded and tidied if they are going to be used.
+
+    >>> classifier = ScoopLogClassifier(milestones=('STEP', 'saved to disk'), info_events=('WARN',))
+    >>> classifier.classify(b'[12:00:00] INFO  STEP [1/8]: Intercepter\\n')
+    ScoopLogEvent(kind='milestone', message='Intercepter')
+    >>> classifier.classify(b'[12:00:01] WARN  Could not load favicon\\n')
+    ScoopLogEvent(kind='info', message='WARN  Could not load favicon')
+    >>> assert classifier.classify(b'[12:00:02] TRACE Intercepted exchange\\n') is None
     """
-    def __init__(self, container, timeout, *args, **kwargs):
-        self.container = container
-        self.timeout = timeout
-        self.timedout = False
-        self.result = {}
-        self.status = None
-        self.exit_code = None
-        self.stderr = None
-        super().__init__(*args, **kwargs)
 
-    def run(self):
-        try:
-            self.result = self.container.wait(timeout=self.timeout)
-        except requests.exceptions.ConnectionError:
-            self.timedout = True
-            # For now, just kill the container. We likely want something gentler,
-            # that politely requests Browsertrix stop and finish up what it's doing,
-            # and then a second timeout, so we can, for instance, preserve partial capture results.
-            self.container.stop(timeout=0)
-            self.result = self.container.wait(timeout=1)
-        finally:
-            try:
-                # If the container has been forceably shut down by the main thread,
-                # these calls will fail.
-                self.container.reload()
-                self.stderr = str(self.container.logs(stdout=False), 'utf-8')
-            except requests.exceptions.RequestException:
-                pass
-            self.exit_code = self.result.get('StatusCode')
-            self.status = self.container.status
-
-
-def handle_scoop_msg(capture_job, msg, milestones='', info_events=''):
-    """
-    Reformat a logline from Scoop and log at the desired level, incrementing
-    the process of the capture job if a "milestone" has been reached.
-    """
-    def tidy_message(message):
-        cleaned = message
-        remove_patterns = [
-            r'^\[.*?\]',
-            r'\s*INFO\s*',
-            r'\s*STEP \[.*?\]:\s*'
-        ]
-        for pattern in remove_patterns:
-            cleaned = re.sub(pattern, '', cleaned)
-        return cleaned
-
-    # the docker library returns stdout as bytes
-    msg = str(msg, 'utf-8')
-    if msg:
-        if any(milestone in msg for milestone in milestones):
-            inc_progress(capture_job, 1, f"[Scoop] {tidy_message(msg)}.")
-        elif any(event in msg for event in info_events):
-            logger.info(f"{capture_job}: [Scoop] {tidy_message(msg)}")
+    MILESTONE = 'milestone'
+    INFO = 'info'
+    DEBUG = 'debug'
+
+    # timestamps, levels, and step counters
+    TIDY_PATTERN = re.compile(r'^\[.*?\]|\s*INFO\s*|\s*STEP \[.*?\]:\s*')
+
+    def __init__(self, milestones, info_events):
+        self.milestones, self.info_events = milestones, info_events
+        self.milestone_pattern = self.compile(milestones)
+        self.info_pattern = self.compile(info_events)
+
+    @staticmethod
+    def compile(substrings):
+        return re.compile(b'|'.join(re.escape(substring.encode()) for substring in substrings))
+
+    def classify(self, line):
+        """
+        Return a ScoopLogEvent for the line, or None if it's a debug line and we aren't logging those.
+        """
+        if self.milestone_pattern.search(line):
+            kind = self.MILESTONE
+        elif self.info_pattern.search(line):
+            kind = self.INFO
+        elif logger.isEnabledFor(logging.DEBUG):
+            kind = self.DEBUG
         else:
-            logger.debug(tidy_message(msg))
+            return None
+        return ScoopLogEvent(kind, self.TIDY_PATTERN.sub('', line.decode('utf-8', errors='replace')).strip())
+
+
+scoop_log_classifier = ScoopLogClassifier(
+    milestones=(
+        'STEP',
+        'Exporting capture',
+        'saved to disk'
+    ),
+    info_events=(
+        'WARN',
+        'ERROR',
+        'User Agent',
+        'captureTimeout',
+        'Indexing WARCS',
+        'Writing',
+        'Finalizing WACZ',
+        'WACZ was finalized',
+    )
+)
+
+
+def handle_scoop_msg(capture_job, msg, metrics=None):
+    """
+    Handle an item of Scoop's output. Scoop servers send progress events (as dicts: see handle_scoop_event),
+    which are passed on, with `metrics`, to be tallied. Otherwise, it's a log line: log it at the desired level,
+    and, if there are no events to go by, increment the progress of the capture job if a "milestone" has been reached.
+    """
+    if isinstance(msg, dict):
+        handle_scoop_event(capture_job, msg, metrics)
+    else:
+        event = scoop_log_classifier.classify(msg)
+        if event and event.kind == ScoopLogClassifier.MILESTONE and metrics is None:
+            inc_progress(capture_job, 1, f"[Scoop] {event.message}.")
+            return
+        elif event and event.kind in (ScoopLogClassifier.MILESTONE, ScoopLogClassifier.INFO):
+            logger.info(f"{capture_job}: [Scoop] {event.message}")
+        elif event:
+            logger.debug(event.message)
+    # save any milestones we've held back, if it's been long enough
+    capture_job.save_progress(force=False)
+
+
+def handle_scoop_event(capture_job, event, metrics):
+    """
+    Count a progress event from a Scoop server (see docker/scoop/server.mjs) towards the capture job's
+    progress, and tally its numbers in `metrics`.
+
+    >>> mocker = getfixture('mocker')
+    >>> mock_inc_progress = mocker.patch('main.tasks.inc_progress')
+    >>> job, metrics = mocker.Mock(), {}
+    >>> for event in [
+    ...     {'event': 'step', 'number': 1, 'total': 2, 'name': 'Intercepter'},
+    ...     {'event': 'progress', 'exchanges': 12, 'bytes': 3456},
+    ...     {'event': 'exporting'},
+    ...     {'event': 'exported', 'path': '/tmp/archive.wacz', 'bytes': 2345},
+    ...     {'event': 'attachment', 'filename': 'screenshot.png', 'bytes': 123},
+    ...     {'event': 'something new'},
+    ... ]:
+    ...     handle_scoop_event(job, event, metrics)
+    >>> [call.args[2] for call in mock_inc_progress.call_args_list]
+    ['[Scoop] Intercepter.', '[Scoop] Exporting capture.', '[Scoop] Capture saved to disk.']
+    >>> metrics
+    {'exchanges': 12, 'bytes_recorded': 3456, 'archive_bytes': 2345, 'attachments': ['screenshot.png']}
+    """
+    kind = event.get('event')
+    if kind == 'step':
+        inc_progress(capture_job, 1, f"[Scoop] {event['name']}.")
+    elif kind == 'progress':
+        metrics['exchanges'] = event.get('exchanges')
+        metrics['bytes_recorded'] = event.get('bytes')
+    elif kind == 'exporting':
+        inc_progress(capture_job, 1, "[Scoop] Exporting capture.")
+    elif kind == 'exported':
+        metrics['archive_bytes'] = event.get('bytes')
+        inc_progress(capture_job, 1, "[Scoop] Capture saved to disk.")
+    elif kind == 'attachment':
+        metrics.setdefault('attachments', []).append(event.get('filename'))
+    else:
+        logger.debug(f"{capture_job}: unknown Scoop event {event}")
 
 
 def inc_progress(capture_job, inc, description):
@@ -156,16 +304,71 @@ def inc_progress(capture_job, inc, description):
     logger.info(f"{capture_job} step {capture_job.step_count}: {capture_job.step_description}")
 
 
-def clean_up_failed_captures():
+def get_resource_limits():
     """
-    Clean up any existing jobs that are marked in_progress but must have timed out by now, based on our hard timeout
-    setting.
+    Instances of the limit classes configured in settings.CELERY_RESOURCE_LIMITS.
+    """
+    return _get_resource_limits(tuple((limit['class'], tuple(limit.get('kwargs', {}).items())) for limit in settings.CELERY_RESOURCE_LIMITS))
+
+
+@lru_cache(maxsize=None)
+def _get_resource_limits(limits):
+    return [symbol_by_name(cls)(**dict(kwargs)) for cls, kwargs in limits]
+
+
+def resources_available():
+    """
+    Before starting another concurrent capture in this worker process, check the limits in
+    settings.CELERY_RESOURCE_LIMITS, which the autoscaler applies before starting worker processes,
+    asking each configured limit class whether there is room to scale up.
+
+    >>> django_settings = getfixture('settings')
+    >>> django_settings.CELERY_RESOURCE_LIMITS = [
+    ...     {'class': 'unittest.mock:Mock', 'kwargs': {'can_scale_up.return_value': True}},
+    ...     {'class': 'unittest.mock:Mock', 'kwargs': {'can_scale_up.return_value': False}},
+    ... ]
+    >>> resources_available()
+    False
+    >>> django_settings.CELERY_RESOURCE_LIMITS = django_settings.CELERY_RESOURCE_LIMITS[:1]
+    >>> resources_available()
+    True
+    """
+    return all(limit.can_scale_up() for limit in get_resource_limits())
+
+
+SCOOP_SUMMARY_FILENAME = "summary.json"
+
+
+def capture_output_directory(capture_job):
+    """
+    Where this worker finds a capture's output, on the shared volume: see settings.SCOOP_OUTPUT_VOLUME.
     """
-    # use database time with a custom where clause to ensure consistent time across workers
-    for capture_job in CaptureJob.objects.filter(status=CaptureJob.Status.IN_PROGRESS).extra(
-            where=[f"capture_start_time < now() - make_interval(secs => {settings.CELERY_TASK_TIME_LIMIT})"]
-    ):
-        capture_job.mark_failed("Timed out.")
+    return f"{settings.SCOOP_OUTPUT_VOLUME_LOCAL_PATH}/{capture_job.id}"
+
+
+def save_archive_file(archive, archive_file, storage):
+    """
+    Ingest a WACZ: read its metadata, then upload it, hashing it along the way, so that only the zip's
+    central directory and metadata files are read twice. Returns the name the archive was saved under.
+    """
+    wacz = zipfile.ZipFile(archive_file)
+    with wacz.open('datapackage.json') as datapackage:
+        metadata = json.load(datapackage)
+        library = metadata['extras']['provenanceInfo']['software']
+        version = metadata['extras']['provenanceInfo']['version']
+        archive.datapackage = metadata
+        archive.capture_software = f"{library}: {version}"
+    with wacz.open('datapackage-digest.json') as datapackage_digest:
+        metadata = json.load(datapackage_digest)
+        archive.datapackage_digest = metadata['hash']
+
+    reader = HashingReader(archive_file)
+    content = File(reader, archive.filename)
+    content.DEFAULT_CHUNK_SIZE = settings.ARCHIVE_UPLOAD_PART_SIZE
+    real_filename = storage.save(archive.filename, content)
+    archive.hash, archive.hash_algorithm = reader.hexdigest(), reader.algorithm
+    archive.size = reader.size
+    return real_filename
 
 
 ### TASKS ###
@@ -181,6 +384,48 @@ def demo_scheduled_task(pause_for_seconds=0):
     return "Celerybeat is working!"
 
 
+def wake_capture_workers(job_count=1):
+    """
+    Queue a run_next_capture task for each of `job_count` newly submitted jobs, up to a total
+    of settings.CAPTURE_WORKER_COUNT queued or running at once. Each keeps working through the queue
+    until it's empty, so there's no need for more.
+
+    Given:
+    >>> mocker, django_settings = [getfixture(i) for i in ['mocker', 'settings']]
+    >>> mock_apply_async = mocker.patch.object(run_next_capture, 'apply_async')
+    >>> django_settings.CAPTURE_WORKER_COUNT = 3
+    >>> tokens = get_capture_worker_tokens()
+    >>> tokens.reset()
+
+    Submitting 5,000 jobs only wakes as many workers as we have...
+    >>> wake_capture_workers(5000)
+    >>> assert mock_apply_async.call_count == 3
+    >>> wake_capture_workers(1)
+    >>> assert mock_apply_async.call_count == 3
+
+    ...and a worker that finds the queue empty takes one more look before standing down,
+    in case it was turned away jobs submitted meanwhile.
+    >>> stand_down_capture_worker()
+    >>> assert mock_apply_async.call_count == 4
+    >>> stand_down_capture_worker()
+    >>> assert mock_apply_async.call_count == 4 and tokens.held() == 2
+    >>> wake_capture_workers(1)
+    >>> assert mock_apply_async.call_count == 5 and tokens.held() == 3
+    >>> tokens.reset()
+    """
+    for _ in range(get_capture_worker_tokens().acquire(job_count)):
+        run_next_capture.apply_async()
+
+
+def stand_down_capture_worker():
+    """
+    Called when a run_next_capture task ends its run: hand back its token, or,
+    if a wakeup was turned away in the meantime, carry on.
+    """
+    if get_capture_worker_tokens().release():
+        run_next_capture.apply_async()
+
+
 @shared_task
 def run_next_capture():
     """
@@ -190,10 +435,6 @@ def run_next_capture():
     >>> basic_domain = target_domains['basic_domain']
 
     Helpers:
-    >>> orig_clean_up_failed = clean_up_failed_captures
-    >>> mock_clean_up_failed = mocker.patch('main.tasks.clean_up_failed_captures')
-    >>> mock_clean_up_failed.side_effect = orig_clean_up_failed
-
     >>> orig_inc_progress = inc_progress
     >>> mock_inc_progress = mocker.patch('main.tasks.inc_progress')
     >>> def run_test_capture(url, stop_before_step=None, capture_job_extra_kwargs=None):
@@ -254,6 +495,21 @@ def run_next_capture():
     >>> job = run_test_capture(f'http://{basic_domain}')
     >>> assert_succeeded(job)
 
+    The same, using a long-lived Scoop server:
+
+    >>> django_settings.SCOOP_SERVER_MODE = True
+    >>> job = run_test_capture(f'http://{basic_domain}')
+    >>> assert_succeeded(job)
+    >>> remove_scoop_servers()
+    >>> django_settings.SCOOP_SERVER_MODE = False
+
+    The same, handing the capture's output off to a finalize_capture task:
+
+    >>> django_settings.CAPTURE_DEFERRED_FINALIZATION = True
+    >>> job = run_test_capture(f'http://{basic_domain}')
+    >>> assert_succeeded(job)
+    >>> django_settings.CAPTURE_DEFERRED_FINALIZATION = False
+
     FAILURE
 
     If an exception is thrown in the main thread while Scoop is working, we stop and clean up.
@@ -272,25 +528,133 @@ def run_next_capture():
     >>> job = run_test_capture('example.com')
     >>> assert job.status == CaptureJob.Status.FAILED
     >>> assert 'Scoop exited with 137' or 'Scoop exited with 143' in caplog.text  #  137 means SIGKILL, 143 means SIGTERM
+    >>> assert 'no partial capture was kept' in str(job.message)
+    >>> assert not docker_client.containers.list(all=True, filters={'ancestor': settings.SCOOP_IMAGE})
+
+    The same goes for the task's soft time limit: a one-shot Scoop container can't save a partial capture,
+    so the job fails, saying so.
+    >>> django_settings.SCOOP_FATAL_TIMEOUT_SECONDS = 60
+    >>> mock_inc_progress.side_effect = raise_on_call(orig_inc_progress, 6, SoftTimeLimitExceeded())
+    >>> job = pending_capture_job_factory(requested_url=basic_domain)
+    >>> _ = run_next_capture.apply()
+    >>> job.refresh_from_db()
+    >>> assert job.status == CaptureJob.Status.FAILED
+    >>> assert 'no partial capture was kept' in str(job.message)
     >>> assert not docker_client.containers.list(all=True, filters={'ancestor': settings.SCOOP_IMAGE})
 
-    We clean up failed jobs before we get started.
-    >>> assert mock_clean_up_failed.call_count > 0
+    BATCHES
+
+    Workers can claim several jobs at once, capturing them one after another...
+    >>> mock_capture = mocker.patch('main.tasks.capture')
+    >>> mock_apply_async = mocker.patch.object(run_next_capture, 'apply_async')
+    >>> django_settings.CAPTURE_BATCH_SIZE = 3
+    >>> jobs = [pending_capture_job_factory() for _ in range(3)]
+    >>> _ = run_next_capture.apply()
+    >>> assert mock_capture.call_args_list == [call(job) for job in jobs]
+    >>> mock_capture.reset_mock()
+
+    ...but they only start a job if it can finish before the soft time limit, releasing the rest back to the queue.
+    >>> django_settings.SCOOP_FATAL_TIMEOUT_SECONDS = django_settings.CELERY_TASK_SOFT_TIME_LIMIT
+    >>> jobs = [pending_capture_job_factory() for _ in range(3)]
+    >>> _ = run_next_capture.apply()
+    >>> assert mock_capture.call_args_list == [call(jobs[0])]
+    >>> for job in jobs[1:]:
+    ...     job.refresh_from_db()
+    ...     assert job.status == CaptureJob.Status.PENDING and not job.capture_start_time
+    >>> assert mock_apply_async.call_count == 2
+    >>> mock_capture.reset_mock()
+
+    If the worker process is sent SIGTERM mid-batch, it finishes the capture in progress, and releases the rest.
+    >>> django_settings.SCOOP_FATAL_TIMEOUT_SECONDS = 1
+    >>> previous_handler = signal.getsignal(signal.SIGTERM)
+    >>> handle_sigterm_in_worker_process()
+    >>> mock_capture.side_effect = lambda job: os.kill(os.getpid(), signal.SIGTERM)
+    >>> jobs = [pending_capture_job_factory() for _ in range(3)]
+    >>> _ = run_next_capture.apply()
+    >>> assert mock_capture.call_args_list == [call(jobs[0])]
+    >>> for job in jobs[1:]:
+    ...     job.refresh_from_db()
+    ...     assert job.status == CaptureJob.Status.PENDING
+    >>> assert signal.getsignal(signal.SIGTERM) is previous_handler
+    >>> worker_shutting_down_event.clear()
     """
 
-    # First, clean up failed captures, because their presence might affect the queue order.
-    clean_up_failed_captures()
+    get_capture_worker_tokens().renew()
+
+    if settings.CAPTURE_CONCURRENCY > 1:
+        capture_batch_running.set()
+        try:
+            captured = asyncio.run(supervise_captures())
+        except SoftTimeLimitExceeded:
+            # the supervisor has stopped and saved the captures in progress
+            captured = True
+        finally:
+            capture_batch_running.clear()
+        if not captured:
+            logger.info('No jobs waiting!')
+            stand_down_capture_worker()
+            return
+        run_next_capture.apply_async()
+        return
 
-    # Retrieve the next job in the queue
-    capture_job = CaptureJob.get_next_job(reserve=True)
-    if not capture_job:
+    # Retrieve the next jobs in the queue
+    capture_jobs = deque(CaptureJob.claim_jobs(settings.CAPTURE_BATCH_SIZE))
+    if not capture_jobs:
         logger.info('No jobs waiting!')
+        stand_down_capture_worker()
         return
 
+    # Work through the batch one job at a time. Only start another job if it can finish before
+    # the soft time limit; hand back any we don't get to, so other workers can pick them up.
+    batch_start_time = monotonic()
+    capture_batch_running.set()
+    try:
+        capture(capture_jobs.popleft())
+        while capture_jobs:
+            if worker_shutting_down_event.is_set():
+                logger.info(f"Worker shutting down: releasing {len(capture_jobs)} unstarted capture jobs.")
+                break
+            if monotonic() - batch_start_time + settings.SCOOP_FATAL_TIMEOUT_SECONDS > settings.CELERY_TASK_SOFT_TIME_LIMIT:
+                logger.info(f"Out of time: releasing {len(capture_jobs)} unstarted capture jobs.")
+                break
+            capture_job = capture_jobs.popleft()
+            capture_job.mark_started()
+            capture(capture_job)
+    finally:
+        capture_batch_running.clear()
+        if capture_jobs:
+            CaptureJob.release_jobs(capture_jobs)
+    run_next_capture.apply_async()
+
+
+@task_failure.connect(sender=run_next_capture)
+def stand_down_failed_capture_worker(**kwargs):
+    """
+    A run_next_capture task that fails doesn't queue up its successor, so hand back its token.
+    """
+    stand_down_capture_worker()
+
+
+def capture(capture_job, stop_event=None):
+    """
+    Capture a single claimed job with Scoop, and save the resulting archive.
+
+    Captures run by the supervisor, in threads of their own, don't hear about the task's soft time limit:
+    instead, the supervisor sets their `stop_event`, and we stop Scoop as if it had timed out.
+    """
     # Basic Setup
-    client = None
     container = None
-    scoop_life_cycle_thread = None
+    scoop_exit = None
+    scoop_stopper = None
+    capture_done = threading.Event()
+    stats_sampler = None
+    scoop_server = None
+    scoop_capture = None
+    local_output_directory = None
+    handed_off = False
+    out_of_memory = False
+    soft_timed_out = False
+    lost_to_timeout = False
 
     try:
         inc_progress(capture_job, 0, "Validating.")
@@ -302,15 +666,30 @@ def run_next_capture():
         capture_job.save()
 
         inc_progress(capture_job, 1, "Connecting to Docker.")
-        client = docker.from_env()
+        client = get_docker_client()
 
         inc_progress(capture_job, 1, "Creating Scoop container.")
+        if settings.SCOOP_SERVER_MODE:
+            try:
+                scoop_server = get_scoop_server(client)
+            except Exception:
+                logger.exception("Could not start a Scoop server: falling back to a one-shot Scoop container.")
+
         archive = Archive(capture_job=capture_job)
-        scoop_output_directory = "/tmp"
-        scoop_capture_filename = archive.filename
-        scoop_capture_full_path = f'/tmp/{scoop_capture_filename}'
-        scoop_summary_filename = "summary.json"
-        scoop_summary_full_path = f'/tmp/{scoop_summary_filename}'
+        if settings.SCOOP_OUTPUT_VOLUME:
+            # Have Scoop write straight to the shared volume, where we can read its output without copying it
+            # out of the container, giving each capture a directory of its own.
+            scoop_output_directory = f"{SCOOP_OUTPUT_MOUNT}/{capture_job.id}"
+            local_output_directory = capture_output_directory(capture_job)
+            os.makedirs(local_output_directory, exist_ok=True)
+            os.chmod(local_output_directory, 0o777)
+        elif scoop_server:
+            # Scoop servers are reused, so give each capture its own directory
+            scoop_output_directory = f"/tmp/captures/{capture_job.id}"
+        else:
+            scoop_output_directory = "/tmp"
+        scoop_capture_full_path = f'{scoop_output_directory}/{archive.filename}'
+        scoop_summary_full_path = f'{scoop_output_directory}/{SCOOP_SUMMARY_FILENAME}'
         scoop_kwargs = {
             "output": scoop_capture_full_path,
             "json-summary-output": scoop_summary_full_path,
@@ -345,145 +724,380 @@ def run_next_capture():
         command = f'npx scoop "{capture_job.validated_url}" ' + " ".join(f"--{key} {format_scoop_option(value)}" for key, value in scoop_kwargs.items() if value)
         logger.info(f"Scoop command: '{command}'")
 
-        container = client.containers.create(
-            settings.SCOOP_IMAGE,
-            shm_size='1GB',
-            mem_limit='4GB',
-            init=True,
-            command=command,
-            detach=True,
-            network=settings.SCOOP_DOCKER_NETWORK or ''
-        )
-
         inc_progress(capture_job, 1, "Starting Scoop.")
-        container.start()
-        scoop_life_cycle_thread = ScoopLifeCycleThread(container, settings.SCOOP_FATAL_TIMEOUT_SECONDS, name="scoop")
-        scoop_life_cycle_thread.start()
-        stdout_stream = container.logs(stderr=False, stream=True)
-        for msg in stdout_stream:
-            handle_scoop_msg(capture_job, msg,
-                milestones=(
-                    'STEP',
-                    'Exporting capture',
-                    'saved to disk'
-                ),
-                info_events=(
-                    'WARN',
-                    'ERROR',
-                    'User Agent'
-                    'captureTimeout',
-                    'Indexing WARCS',
-                    'Writing',
-                    'Finalizing WACZ',
-                    'WACZ was finalized',
-                )
+        if scoop_server:
+            container = scoop_server.container
+            scoop_capture = scoop_server.capture(
+                capture_job.validated_url,
+                {key: str(format_scoop_option(value)) for key, value in scoop_kwargs.items() if value},
+                settings.SCOOP_FATAL_TIMEOUT_SECONDS
             )
+            stdout_stream = scoop_capture
+        else:
+            container = get_scoop_container_pool().start_container(client, command)
+            scoop_exit = get_container_watcher().watch(container, settings.SCOOP_FATAL_TIMEOUT_SECONDS, settings.SCOOP_STOP_GRACE_SECONDS)
+            stdout_stream = container.logs(stderr=False, stream=True)
+        if settings.SCOOP_STATS_SAMPLE_SECONDS:
+            stats_sampler = ContainerStatsSampler(container, settings.SCOOP_STATS_SAMPLE_SECONDS, from_first_sample=bool(scoop_server))
+            stats_sampler.start()
+        if stop_event:
+            scoop_stopper = threading.Thread(target=stop_scoop_when_set, args=(stop_event, capture_done, scoop_capture, scoop_exit), name="scoop-stopper", daemon=True)
+            scoop_stopper.start()
+        # Scoop servers report progress as events; for one-shot containers, we go by Scoop's logs.
+        scoop_metrics = {} if scoop_server else None
+        for msg in stdout_stream:
+            handle_scoop_msg(capture_job, msg, scoop_metrics)
+        if scoop_metrics:
+            logger.info(f"{capture_job}: Scoop recorded {scoop_metrics.get('exchanges')} exchanges ({scoop_metrics.get('bytes_recorded')} bytes), producing a {scoop_metrics.get('archive_bytes')}-byte archive.")
 
-        scoop_life_cycle_thread.join()
-        if scoop_life_cycle_thread.exit_code != 0:
+        if scoop_capture:
+            exit_code, stderr = scoop_capture.exit_code, scoop_capture.stderr
+        else:
+            # the log stream ends when the container does; its "die" event should be along shortly
+            scoop_exit.wait(timeout=settings.SCOOP_STOP_GRACE_SECONDS)
+            exit_code = scoop_exit.exit_code
+            stderr = str(container.logs(stdout=False), 'utf-8', errors='replace')
+        # Scoop may exit 0 even if Docker OOM-killed one of its browser's processes: don't trust its output.
+        if (scoop_exit and scoop_exit.oom_killed) or (scoop_capture and scoop_server.exit.oom_killed):
+            logger.error(f"Scoop exited with {exit_code}, but ran out of memory: {stderr}")
+            raise HaltCaptureException
+        if exit_code != 0:
             # this is NOT how we want to handle the verbose output of stderr. What's the best way to log?
             # send a special error email?
-            logger.error(f"Scoop exited with {scoop_life_cycle_thread.exit_code}: {scoop_life_cycle_thread.stderr}")
+            logger.error(f"Scoop exited with {exit_code}: {stderr}")
             raise HaltCaptureException
 
     except HaltCaptureException:
         logger.info("HaltCaptureException thrown.")
     except SoftTimeLimitExceeded:
-        logger.warning(f"Soft timeout while capturing job {capture_job.id}.")
-        # might include code here for politely asking Scoop to stop recording.
+        logger.warning(f"Soft timeout while capturing job {capture_job.id}: stopping Scoop.")
+        # Keep whatever Scoop has recorded so far, if we can: only Scoop servers can save a partial capture.
+        soft_timed_out = True
+        if scoop_capture:
+            scoop_capture.stop(settings.SCOOP_STOP_GRACE_SECONDS)
     except:  # noqa
         logger.exception(f"Exception while capturing job {capture_job.id}:")
     finally:
         try:
+            # Docker reports OOM kills as they happen: see ContainerWatcher
+            out_of_memory = bool((scoop_exit and scoop_exit.oom_killed) or (scoop_capture and scoop_server.exit.oom_killed))
+            if out_of_memory:
+                logger.warning(f"{capture_job}: Scoop was killed for running out of memory.")
+
+            if stats_sampler:
+                capture_job.record_resource_usage(stats_sampler.stop())
+
+            if scoop_stopper:
+                # don't stop Scoop once we're done with it, and wait for any stop in progress
+                capture_done.set()
+                stop_event.set()
+                scoop_stopper.join()
+
+            # One-shot Scoop containers are stopped on timeout (see ContainerWatcher), losing what they recorded.
+            lost_to_timeout = bool(scoop_exit) and (soft_timed_out or scoop_exit.timedout)
+            if lost_to_timeout:
+                logger.warning(f"{capture_job}: Scoop timed out in a one-shot container, so no partial capture was kept.")
+
+            if scoop_capture and scoop_capture.exit_code is None:
+                # The server died, or is still busy with this capture: start a fresh one next time.
+                recycle_scoop_server(scoop_server, force=True)
+                scoop_server = container = None
+
             if container:
 
-                # For now, just kill the container. We might want something gentler.
-                container.stop()
-
-                try:
-                    to_extract = [scoop_capture_filename, scoop_summary_filename]
-                    with extract_files_from_container(to_extract, scoop_output_directory, container) as file_handles:
-
-                        archive_file = file_handles[scoop_capture_filename]
-                        summary_file = file_handles[scoop_summary_filename]
-
-                        if not archive_file:
-                            raise NoArchiveProduced(f"{scoop_capture_filename} not found.")
-
-                        inc_progress(capture_job, 1, "Processing archive.")
-                        archive.hash, archive.hash_algorithm = get_file_hash(archive_file)
-                        assert not archive_file.read()
-                        archive.size = archive_file.tell()
-                        # Should we do validity checks of any kind? Save regardless? TBD.
-                        archive_file.seek(0)
-                        assert zipfile.is_zipfile(archive_file), "Invalid WACZ"
-                        wacz = zipfile.ZipFile(archive_file)
-                        with wacz.open('datapackage.json') as datapackage:
-                            metadata = json.load(datapackage)
-                            library = metadata['extras']['provenanceInfo']['software']
-                            version = metadata['extras']['provenanceInfo']['version']
-                            archive.datapackage = metadata
-                            archive.capture_software = f"{library}: {version}"
-                        with wacz.open('datapackage-digest.json') as datapackage_digest:
-                            metadata = json.load(datapackage_digest)
-                            archive.datapackage_digest = metadata['hash']
-
-                        inc_progress(capture_job, 1, "Saving archive.")
-                        archive_file.seek(0)
-                        storage = get_archive_storage()
-                        real_filename = storage.save(archive.filename, archive_file)
-                        try:
-                            assert real_filename == archive.filename
-                        except AssertionError:
-                            # This would only happen if we accidentally produce duplicate filenames, which
-                            # shouldn't happen, since we include the capture job id. But, if it does, we'll
-                            # want to know about it, so we can manually clean up the file after it expires.
-                            logger.error(f'The archive for capture job {capture_job.id} has been saved as {real_filename}, not {archive.filename}.')
-
-                        inc_progress(capture_job, 1, "Saving summary metadata.")
-                        archive.summary = json.load(summary_file)
-                        scoop_state = archive.summary['states'][archive.summary['state']]
-                        if scoop_state == 'COMPLETE':
-                            archive.partial_capture = False
-                        elif scoop_state == 'PARTIAL':
-                            archive.partial_capture = True
-                        else:
-                            logger.error(f"Capture Job {capture_job.id} produced artifacts but reports state '{scoop_state}': how did we find ourselves here?")
-
-                    archive.download_url = storage.url(real_filename)
-                    archive.download_expiration_timestamp = datetime_from_timestamp(parse_querystring(archive.download_url)['Expires'][0])
-                    archive.save()
-
-                    if capture_job.include_screenshot:
-                        inc_progress(capture_job, 1, "Saving screenshot.")
-                        screenshot_filename = archive.summary["attachments"].get("screenshot")
-                        if screenshot_filename:
-                            try:
-                                with extract_file_from_container(screenshot_filename, f"{scoop_output_directory}/{screenshot_filename}", container) as screenshot_file:
-                                    screenshot_file.seek(0)
-                                    archive.screenshot = File(screenshot_file, screenshot_filename)
-                                    archive.save(update_fields=["screenshot"])
-                            except docker.errors.NotFound:
-                                logger.info("No screenshot available.")
+                if not scoop_server:
+                    container.stop(timeout=settings.SCOOP_STOP_GRACE_SECONDS)
+
+                if out_of_memory:
+                    # the job fails below, without saving whatever Scoop left behind
+                    pass
+                elif local_output_directory and settings.CAPTURE_DEFERRED_FINALIZATION and not lost_to_timeout:
+                    # Free up this worker for the next capture: finalize_capture picks up Scoop's output
+                    # from the shared volume, and takes over the job's status and the output directory.
+                    capture_job.save_progress()
+                    finalize_capture.delay(capture_job.id)
+                    handed_off = True
+                    local_output_directory = None
+                else:
+                    try:
+                        to_extract = [archive.filename, SCOOP_SUMMARY_FILENAME]
+                        # Attachments, like the screenshot, are only named in the summary, so if we want any,
+                        # pick up every file Scoop wrote, in the same pass.
+                        if local_output_directory:
+                            output_files = read_files_from_directory(to_extract, local_output_directory, extra_files=capture_job.include_screenshot)
                         else:
-                            logger.info("No screenshot available.")
-
-                    capture_job.mark_completed()
-                    logger.info("Capture succeeded.")
-                except NoArchiveProduced:
-                    logger.info("Capture failed.")
-
-                container.remove(force=True)
-
-            if client:
-                client.close()
+                            output_files = extract_files_from_container(to_extract, scoop_output_directory, container, extra_files=capture_job.include_screenshot)
+                        with output_files as file_handles:
+                            save_capture_artifacts(capture_job, archive, file_handles)
+                    except NoArchiveProduced:
+                        logger.info("Capture failed.")
+
+                if scoop_server:
+                    if not handed_off:
+                        scoop_server.clean_up(scoop_output_directory)
+                    # a server that has run out of memory once would report it for every later capture
+                    recycle_scoop_server(scoop_server, force=out_of_memory)
+                    scoop_server = None
+                else:
+                    container.remove(force=True)
 
         except:  # noqa
             logger.exception(f"Exception while finishing job {capture_job.id}:")
         finally:
-            if capture_job.status == CaptureJob.Status.IN_PROGRESS:
-                capture_job.mark_failed('Failed during capture.')
-    run_next_capture.apply_async()
+            if scoop_server:
+                recycle_scoop_server(scoop_server)
+            if scoop_exit:
+                get_container_watcher().unwatch(scoop_exit)
+            if local_output_directory:
+                shutil.rmtree(local_output_directory, ignore_errors=True)
+            if capture_job.status == CaptureJob.Status.IN_PROGRESS and not handed_off:
+                if out_of_memory:
+                    capture_job.mark_failed('Scoop ran out of memory.')
+                elif lost_to_timeout:
+                    capture_job.mark_failed('Timed out: no partial capture was kept.')
+                else:
+                    capture_job.mark_failed('Failed during capture.')
+
+
+def stop_scoop_when_set(stop_event, capture_done, scoop_capture=None, scoop_exit=None):
+    """
+    Wait, in a thread of its own, for a capture's `stop_event`, and then, unless the capture is done with Scoop,
+    stop Scoop gracefully, keeping what it has captured so far, as for a timeout.
+
+    >>> scoop_capture = getfixture('mocker').Mock()
+    >>> stop_event, capture_done = threading.Event(), threading.Event()
+    >>> stop_event.set()
+    >>> stop_scoop_when_set(stop_event, capture_done, scoop_capture)
+    >>> scoop_capture.stop.assert_called_once_with(settings.SCOOP_STOP_GRACE_SECONDS)
+    >>> capture_done.set()
+    >>> stop_scoop_when_set(stop_event, capture_done, scoop_capture)
+    >>> scoop_capture.stop.assert_called_once()
+    """
+    stop_event.wait()
+    if capture_done.is_set():
+        return
+    logger.warning("Soft timeout: stopping Scoop.")
+    if scoop_capture:
+        scoop_capture.stop(settings.SCOOP_STOP_GRACE_SECONDS)
+    else:
+        watcher = get_container_watcher()
+        if scoop_exit.timer:
+            scoop_exit.timer.cancel()
+        watcher.time_out(scoop_exit, settings.SCOOP_STOP_GRACE_SECONDS)
+
+
+@shared_task
+def finalize_capture(capture_job_id):
+    """
+    Save the archive, summary and screenshot of a capture whose Scoop run has finished, reading them from
+    the shared output volume, and then remove them. See settings.CAPTURE_DEFERRED_FINALIZATION.
+
+    Given a job whose capture has left its output on the shared volume:
+    >>> mocker, in_progress_capture_job_factory, django_settings = [getfixture(i) for i in ['mocker', 'in_progress_capture_job_factory', 'settings']]
+    >>> django_settings.SCOOP_OUTPUT_VOLUME_LOCAL_PATH = str(getfixture('tmp_path'))
+    >>> mock_save = mocker.patch('main.tasks.save_capture_artifacts', side_effect=lambda job, archive, files: job.mark_completed())
+    >>> mock_wake = mocker.patch('main.tasks.wake_capture_workers')
+    >>> job = in_progress_capture_job_factory()
+    >>> directory = capture_output_directory(job)
+    >>> os.makedirs(directory)
+    >>> with open(f"{directory}/{Archive(capture_job=job).filename}", 'w') as f:
+    ...     _ = f.write('wacz')
+
+    The artifacts are saved, and the output cleaned up.
+    >>> _ = finalize_capture.apply([job.id])
+    >>> assert mock_save.call_args[0][2][Archive(capture_job=job).filename]
+    >>> job.refresh_from_db()
+    >>> assert job.status == CaptureJob.Status.COMPLETED
+    >>> assert not os.path.exists(directory)
+
+    The job no longer counts against its user's concurrent captures, so we wake a worker for their next one.
+    >>> mock_wake.assert_called_once_with()
+
+    If there's nothing to save, the job fails.
+    >>> mock_save.side_effect = NoArchiveProduced
+    >>> job = in_progress_capture_job_factory()
+    >>> _ = finalize_capture.apply([job.id])
+    >>> job.refresh_from_db()
+    >>> assert job.status == CaptureJob.Status.FAILED
+    >>> assert mock_wake.call_count == 2
+    """
+    capture_job = CaptureJob.objects.get(id=capture_job_id)
+    directory = capture_output_directory(capture_job)
+    try:
+        archive = Archive(capture_job=capture_job)
+        to_read = [archive.filename, SCOOP_SUMMARY_FILENAME]
+        if not os.path.isdir(directory):
+            raise NoArchiveProduced(f"{directory} not found.")
+        with read_files_from_directory(to_read, directory, extra_files=capture_job.include_screenshot) as file_handles:
+            save_capture_artifacts(capture_job, archive, file_handles)
+    except NoArchiveProduced:
+        logger.info("Capture failed.")
+    except:  # noqa
+        logger.exception(f"Exception while finalizing job {capture_job.id}:")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+        if capture_job.status == CaptureJob.Status.IN_PROGRESS:
+            capture_job.mark_failed('Failed during capture.')
+        # The capture worker may have stood down while this job still counted against its user's
+        # concurrent captures (see CaptureJob.claim_jobs), leaving their other jobs waiting.
+        wake_capture_workers()
+
+
+def save_capture_artifacts(capture_job, archive, file_handles):
+    """
+    Save the archive, summary and screenshot from a finished Scoop run, given a dict of their
+    filenames to open files, and mark the job completed, if it's still in progress.
+    """
+    archive_file = file_handles[archive.filename]
+    summary_file = file_handles[SCOOP_SUMMARY_FILENAME]
+
+    if not archive_file:
+        raise NoArchiveProduced(f"{archive.filename} not found.")
+
+    inc_progress(capture_job, 1, "Saving archive.")
+    storage = get_archive_storage()
+    # Should we do validity checks of any kind? Save regardless? TBD.
+    try:
+        real_filename = save_archive_file(archive, archive_file, storage)
+    except zipfile.BadZipFile:
+        raise AssertionError("Invalid WACZ")
+    try:
+        assert real_filename == archive.filename
+    except AssertionError:
+        # This would only happen if we accidentally produce duplicate filenames, which
+        # shouldn't happen, since we include the capture job id. But, if it does, we'll
+        # want to know about it, so we can manually clean up the file after it expires.
+        logger.error(f'The archive for capture job {capture_job.id} has been saved as {real_filename}, not {archive.filename}.')
+
+    inc_progress(capture_job, 1, "Saving summary metadata.")
+    archive.summary = json.load(summary_file)
+    scoop_state = archive.summary['states'][archive.summary['state']]
+    if scoop_state == 'COMPLETE':
+        archive.partial_capture = False
+    elif scoop_state == 'PARTIAL':
+        archive.partial_capture = True
+    else:
+        logger.error(f"Capture Job {capture_job.id} produced artifacts but reports state '{scoop_state}': how did we find ourselves here?")
+
+    archive.download_url = storage.url(real_filename)
+    archive.download_expiration_timestamp = datetime_from_timestamp(parse_querystring(archive.download_url)['Expires'][0])
+    archive.save()
+
+    if capture_job.include_screenshot:
+        inc_progress(capture_job, 1, "Saving screenshot.")
+        screenshot_filename = archive.summary["attachments"].get("screenshot")
+        screenshot_file = file_handles.get(screenshot_filename) if screenshot_filename else None
+        if screenshot_file:
+            archive.screenshot = File(screenshot_file, screenshot_filename)
+            archive.save(update_fields=["screenshot"])
+        else:
+            logger.info("No screenshot available.")
+
+    if capture_job.mark_completed_if_in_progress():
+        logger.info("Capture succeeded.")
+    else:
+        logger.warning(f"Capture job {capture_job.id} was marked {capture_job.status} before its artifacts were saved.")
+
+
+### CAPTURE SUPERVISOR ###
+
+async def supervise_captures():
+    """
+    Run up to settings.CAPTURE_CONCURRENCY captures at once, claiming another job whenever one finishes
+    (or new jobs arrive) and the host's resource limits allow, until the queue is empty or there isn't time
+    to finish another capture before the soft time limit. Returns how many jobs were captured.
+
+    Capturing is blocking work for docker-py, so each capture runs in a thread of its own: the supervisor
+    just decides when to start them, while each streams its logs, enforces its timeout and processes its
+    archive independently. Only the main thread hears about the task's soft time limit, so the supervisor passes
+    each capture an Event, and sets them all when the limit is reached, to stop the captures in progress.
+
+    Given:
+    >>> mocker, django_settings = [getfixture(i) for i in ['mocker', 'settings']]
+    >>> django_settings.CAPTURE_CONCURRENCY = 3
+    >>> _ = mocker.patch('main.tasks.resources_available', return_value=True)
+    >>> jobs = list(range(7))
+    >>> _ = mocker.patch.object(CaptureJob, 'claim_jobs', side_effect=lambda count: [jobs.pop(0)] if jobs else [])
+    >>> lock, running, most_running, captured = threading.Lock(), [0], [0], []
+    >>> def mock_capture(job, stop_event):
+    ...     with lock:
+    ...         running[0] += 1
+    ...         most_running[0] = max(most_running[0], running[0])
+    ...     sleep(.2)
+    ...     with lock:
+    ...         running[0] -= 1
+    ...         captured.append(job)
+    >>> _ = mocker.patch('main.tasks.capture', side_effect=mock_capture)
+
+    Jobs are captured several at a time, but no more than CAPTURE_CONCURRENCY at once:
+    >>> asyncio.run(supervise_captures())
+    7
+    >>> assert sorted(captured) == list(range(7))
+    >>> assert most_running[0] == 3
+
+    If the host is short of memory or CPU, we don't start another capture until one finishes:
+    >>> _ = mocker.patch('main.tasks.resources_available', return_value=False)
+    >>> jobs, captured, most_running[0] = list(range(3)), [], 0
+    >>> asyncio.run(supervise_captures())
+    3
+    >>> assert most_running[0] == 1
+
+    If the soft time limit is reached, the captures in progress are told to stop, and we wait for them to finish:
+    >>> _ = mocker.patch('main.tasks.resources_available', return_value=True)
+    >>> _ = mocker.patch.object(CaptureJob, 'claim_jobs', side_effect=[[0], SoftTimeLimitExceeded()])
+    >>> stopped = []
+    >>> _ = mocker.patch('main.tasks.capture', side_effect=lambda job, stop_event: stopped.append(stop_event.wait(5)))
+    >>> with assert_raises(SoftTimeLimitExceeded):
+    ...     asyncio.run(supervise_captures())
+    >>> stopped
+    [True]
+    """
+    start_time = monotonic()
+    running = {}
+    captured = 0
+    try:
+        while True:
+            if worker_shutting_down_event.is_set():
+                logger.info("Worker shutting down: not starting any more captures.")
+                break
+            if monotonic() - start_time + settings.SCOOP_FATAL_TIMEOUT_SECONDS > settings.CELERY_TASK_SOFT_TIME_LIMIT:
+                break
+
+            if len(running) < settings.CAPTURE_CONCURRENCY and (not running or resources_available()):
+                capture_jobs = await asyncio.to_thread(in_own_connection, CaptureJob.claim_jobs, 1)
+                if capture_jobs:
+                    stop_event = threading.Event()
+                    running[asyncio.create_task(asyncio.to_thread(in_own_connection, capture, capture_jobs[0], stop_event))] = stop_event
+                    captured += 1
+                    continue
+                if not running:
+                    break
+
+            # wait for a capture to finish, checking for new jobs every so often
+            done, _pending = await asyncio.wait(running, timeout=settings.CAPTURE_SUPERVISOR_POLL_SECONDS, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                del running[task]
+
+        if running:
+            await asyncio.wait(running)
+    except (SoftTimeLimitExceeded, asyncio.CancelledError):
+        # The soft time limit may interrupt the event loop rather than this coroutine, in which case asyncio.run()
+        # cancels us. Either way, it then waits for the capture threads to finish, so have them stop Scoop.
+        logger.warning(f"Soft timeout: stopping {len(running)} captures in progress.")
+        for stop_event in running.values():
+            stop_event.set()
+        raise
+    return captured
+
+
+def in_own_connection(func, *args):
+    """
+    Call func in a thread of the supervisor's, closing the thread's database connection afterwards.
+    """
+    try:
+        return func(*args)
+    finally:
+        connection.close()
 
 
 @shared_task(bind=True, max_retries=settings.WEBHOOK_MAX_RETRIES)
@@ -643,3 +1257,45 @@ def clean_up_archive(archive_id):
 
     archive.download_url = None
     archive.save()
+
+
+@shared_task
+def clean_up_failed_captures():
+    """
+    Clean up any existing jobs that are marked in_progress but must have timed out by now, based on our hard timeout
+    setting. Scheduled to run periodically.
+    """
+    for job_id, user_id, capture_start_time in CaptureJob.fail_timed_out_jobs(settings.CELERY_TASK_TIME_LIMIT, "Timed out."):
+        logger.warning(f"Capture job {job_id} for user {user_id}, started at {capture_start_time}, timed out.")
+        if settings.SCOOP_OUTPUT_VOLUME_LOCAL_PATH:
+            # in case a finalize_capture task was lost
+            shutil.rmtree(f"{settings.SCOOP_OUTPUT_VOLUME_LOCAL_PATH}/{job_id}", ignore_errors=True)
+
+
+@shared_task
+def reconcile_capture_queue():
+    """
+    Repair any drift between the capture queue backend and the database.
+
+    Given:
+    >>> pending_capture_job_factory, django_settings, caplog = [getfixture(i) for i in ['pending_capture_job_factory', 'settings', 'caplog']]
+    >>> django_settings.CAPTURE_QUEUE_BACKEND = 'main.queues.RedisQueue'
+    >>> queue = get_capture_queue()
+    >>> _ = queue.reconcile()
+    >>> job = pending_capture_job_factory()
+
+    Jobs missing from the mirror are restored...
+    >>> queue.remove_jobs([job])
+    >>> _ = reconcile_capture_queue.apply()
+    >>> assert 'added 1 and removed 0' in caplog.text
+    >>> assert job.queue_position() == 1
+
+    ...and jobs that are no longer pending are dropped.
+    >>> CaptureJob.objects.filter(pk=job.pk).update(status=CaptureJob.Status.FAILED)
+    1
+    >>> _ = reconcile_capture_queue.apply()
+    >>> assert 'added 0 and removed 1' in caplog.text
+    >>> assert queue.queue_depth(human=False) == 0
+    """
+    added, removed = get_capture_queue().reconcile()
+    logger.info(f"Reconciled capture queue: added {added} and removed {removed} jobs.")
@@ -0,0 +1,79 @@
+import hashlib
+import io
+import json
+import os
+import tempfile
+import zipfile
+
+from django.core.files.storage import FileSystemStorage
+
+from ..models import Archive, CaptureJob
+from ..tasks import save_archive_file
+
+import pytest
+
+
+class CountingFile(io.RawIOBase):
+    """
+    A seekable file that counts the bytes read from it.
+    """
+    def __init__(self, file):
+        self.file = file
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self.file.seek(offset, whence)
+
+    def tell(self):
+        return self.file.tell()
+
+    def readinto(self, buffer):
+        data = self.file.read(len(buffer))
+        buffer[:len(data)] = data
+        self.bytes_read += len(data)
+        return len(data)
+
+
+def make_wacz(file, size, chunk_size=1024*1024):
+    """
+    Write a WACZ-shaped zip of roughly `size` bytes to `file`, returning its hash.
+    """
+    with zipfile.ZipFile(file, 'w') as wacz:
+        wacz.writestr('datapackage.json', json.dumps({'extras': {'provenanceInfo': {'software': 'Scoop', 'version': '0.0.0'}}}))
+        wacz.writestr('datapackage-digest.json', json.dumps({'hash': 'sha256:digest'}))
+        with wacz.open('archive/data.warc.gz', 'w') as warc:
+            for _ in range(size // chunk_size):
+                warc.write(os.urandom(chunk_size))
+    file.seek(0)
+    hasher = hashlib.sha256()
+    while chunk := file.read(chunk_size):
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+@pytest.mark.parametrize('megabytes', [10, pytest.param(100, marks=pytest.mark.slow), pytest.param(200, marks=pytest.mark.slow)])
+def test_archive_ingestion(tmp_path, megabytes):
+    """
+    Ingesting an archive should read it only once, apart from the zip's central directory and metadata,
+    while hashing, sizing and uploading it.
+    """
+    storage = FileSystemStorage(location=tmp_path)
+    archive = Archive(capture_job=CaptureJob(id=1, validated_url='https://example.com'))
+    with tempfile.TemporaryFile() as file:
+        expected_hash = make_wacz(file, megabytes * 1024 * 1024)
+        size = file.seek(0, io.SEEK_END)
+        archive_file = CountingFile(file)
+        real_filename = save_archive_file(archive, archive_file, storage)
+
+    assert real_filename == 'job-1-example-com.wacz'
+    assert (archive.hash, archive.hash_algorithm, archive.size) == (expected_hash, 'sha256', size)
+    assert archive.capture_software == 'Scoop: 0.0.0'
+    assert archive.datapackage_digest == 'sha256:digest'
+    assert (tmp_path / 'job-1-example-com.wacz').stat().st_size == size
+    assert archive_file.bytes_read < size + 64 * 1024, f"Read {archive_file.bytes_read} bytes of a {size} byte archive."
@@ -0,0 +1,66 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+from ..models import Archive, CaptureJob
+
+import pytest
+
+
+@pytest.fixture
+def busy_queue(historical_capture_jobs_factory, user_factory, pending_capture_job_factory, in_progress_capture_job_factory):
+    """
+    A million finished jobs, with a realistic number of pending and in-progress jobs on top.
+    """
+    historical_capture_jobs_factory()
+    users = [user_factory() for _ in range(5)]
+    for i in range(50):
+        pending_capture_job_factory(user=users[i % len(users)], human=bool(i % 2))
+    for i in range(5):
+        in_progress_capture_job_factory(user=users[i])
+    return users
+
+
+def assert_uses_index(queryset, *index_names):
+    """
+    Assert that the query is planned using (one of) the given indexes, rather than scanning history.
+    """
+    plan = queryset.explain()
+    assert any(index_name in plan for index_name in index_names), f"Expected a plan using {' or '.join(index_names)}, got:\n{plan}"
+
+
+@pytest.mark.slow
+def test_hot_queries_use_indexes(busy_queue):
+    """
+    The queries run on every claim, status poll, and cleanup should only touch the live part of the
+    queue, however much history accumulates.
+    """
+    pending_jobs = CaptureJob.objects.filter(status=CaptureJob.Status.PENDING)
+    job = pending_jobs.filter(human=False).order_by('-order').first()
+
+    # CaptureJob.claim_jobs_from_db
+    assert_uses_index(CaptureJob.pending_jobs_in_queue_order()[:1], 'pending_queue_idx')
+    assert_uses_index(CaptureJob.pending_jobs_in_queue_order().filter(human=False)[:1], 'pending_queue_idx')
+
+    # CaptureJob.queue_position_from_db
+    assert_uses_index(pending_jobs.filter(order__lte=job.order, human=job.human), 'pending_queue_idx')
+
+    # CaptureJob.get_fair_queue_position
+    assert_uses_index(pending_jobs.filter(human=job.human, user_id=job.user_id).order_by('-order')[:1], 'pending_user_order_idx', 'pending_queue_idx')
+    assert_uses_index(pending_jobs.filter(
+        models.Exists(pending_jobs.filter(user_id=models.OuterRef('user_id'), order=models.OuterRef('previous_order'))),
+        human=job.human,
+        previous_order__gt=job.order
+    ).order_by('order')[:1], 'pending_previous_order_idx', 'pending_queue_idx')
+    assert_uses_index(CaptureJob.objects.filter(human=job.human).order_by('-order')[:1], 'queue_order_idx')
+
+    # clean_up_failed_captures
+    assert_uses_index(CaptureJob.objects.filter(
+        status=CaptureJob.Status.IN_PROGRESS,
+        capture_start_time__lt=timezone.now() - timedelta(seconds=settings.CELERY_TASK_TIME_LIMIT)
+    ), 'in_progress_start_time_idx')
+
+    # ArchiveQuerySet.expired
+    assert_uses_index(Archive.objects.expired(), 'downloadable_expiration_idx')
@@ -1,19 +1,21 @@
 from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
+import time
 
 
 from django.conf import settings
-from django.db import connections
+from django.db import connections, transaction
 from django.utils import timezone
 from rest_framework.settings import api_settings
 
 from ..models import CaptureJob
+from ..queues import get_capture_queue, get_robot_claim_share
 from ..tasks import clean_up_failed_captures
 
 import pytest
 
 
-def test_job_queue_order(user_factory, pending_capture_job_factory):
+def test_job_queue_order(capture_queue, user_factory, pending_capture_job_factory, assert_num_queries):
     """
     Jobs should be processed round-robin, one per user.
     """
@@ -48,12 +50,213 @@ def test_job_queue_order(user_factory, pending_capture_job_factory):
         expected_queue_position = expected_order.index(i)+1
         assert queue_position == expected_queue_position, f"Job {i} has queue position {queue_position}, should be {expected_queue_position}."
 
+    # test CaptureJob.objects.with_queue_position, which should agree, in a single query
+    with assert_num_queries(select=1):
+        queue_positions = [job.queue_position() for job in CaptureJob.objects.with_queue_position().order_by('pk')]
+    assert queue_positions == [expected_order.index(i)+1 for i in range(len(jobs))]
+
     # test CaptureJob.get_next_job
     expected_next_jobs = [jobs[i] for i in expected_order]
     next_jobs = [CaptureJob.get_next_job(reserve=True) for i in range(len(jobs))]
     assert next_jobs == expected_next_jobs
 
 
+def test_job_queue_order_after_claims(capture_queue, user_factory, pending_capture_job_factory):
+    """
+    Jobs submitted after others have been claimed should still be processed round-robin.
+    """
+    user_one = user_factory()
+    user_two = user_factory()
+    user_three = user_factory()
+
+    jobs = [
+        pending_capture_job_factory(user=user_one),
+        pending_capture_job_factory(user=user_one),
+        pending_capture_job_factory(user=user_one),
+        pending_capture_job_factory(user=user_two),
+    ]
+    assert CaptureJob.get_next_job(reserve=True) == jobs[0]
+
+    # user_one just had a turn, so user_three goes ahead of user_one's next job...
+    jobs.append(pending_capture_job_factory(user=user_three))
+    # ...and user_two gets another turn before user_one's last job
+    jobs.append(pending_capture_job_factory(user=user_two))
+
+    expected_order = [3, 1, 4, 5, 2]
+    for i in expected_order:
+        assert jobs[i].queue_position() == expected_order.index(i) + 1
+    next_jobs = [CaptureJob.get_next_job(reserve=True) for i in expected_order]
+    assert next_jobs == [jobs[i] for i in expected_order]
+
+
+def test_claim_and_release_jobs(capture_queue, user_factory, pending_capture_job_factory):
+    """
+    Jobs can be claimed in batches, in queue order; released jobs go back to their place in line.
+    """
+    user_one = user_factory()
+    user_two = user_factory()
+    jobs = [
+        pending_capture_job_factory(user=user_one),
+        pending_capture_job_factory(user=user_one),
+        pending_capture_job_factory(user=user_two),
+    ]
+
+    claimed = CaptureJob.claim_jobs(2)
+    assert claimed == [jobs[0], jobs[2]]
+    for job in claimed:
+        assert job.status == CaptureJob.Status.IN_PROGRESS
+        assert job.capture_start_time
+    assert jobs[1].queue_position() == 1
+
+    CaptureJob.release_jobs(claimed[1:])
+    jobs[2].refresh_from_db()
+    assert jobs[2].status == CaptureJob.Status.PENDING
+    assert not jobs[2].capture_start_time
+    assert CaptureJob.claim_jobs(5) == [jobs[2], jobs[1]]
+
+
+def test_capture_weight(capture_queue, user_factory, pending_capture_job_factory):
+    """
+    Users with a capture weight of N get N jobs per turn.
+    """
+    user_one = user_factory(capture_weight=2)
+    user_two = user_factory()
+    jobs = [
+        pending_capture_job_factory(user=user_one),
+        pending_capture_job_factory(user=user_one),
+        pending_capture_job_factory(user=user_one),
+        pending_capture_job_factory(user=user_two),
+        pending_capture_job_factory(user=user_two),
+    ]
+
+    expected_order = [0, 1, 3, 2, 4]
+    for i in expected_order:
+        assert jobs[i].queue_position() == expected_order.index(i) + 1
+    assert CaptureJob.claim_jobs(5) == [jobs[i] for i in expected_order]
+
+
+def test_max_concurrent_captures(capture_queue, user_factory, pending_capture_job_factory):
+    """
+    Users at their limit of concurrent captures are skipped, until one of their captures finishes.
+    """
+    user_one = user_factory(max_concurrent_captures=1)
+    user_two = user_factory()
+    jobs = [
+        pending_capture_job_factory(user=user_one),
+        pending_capture_job_factory(user=user_one),
+        pending_capture_job_factory(user=user_two),
+        pending_capture_job_factory(user=user_two),
+    ]
+
+    # a single batch can't take user_one over their limit...
+    claimed = CaptureJob.claim_jobs(3)
+    assert claimed[:2] == [jobs[0], jobs[2]] and jobs[1] not in claimed
+    # ...and later claims pass them over, while their first job is in progress
+    assert jobs[1] not in CaptureJob.claim_jobs(5)
+    assert CaptureJob.claim_jobs(1) == []
+    assert jobs[1].queue_position() == 1
+
+    jobs[0].mark_failed("Failed.")
+    assert CaptureJob.claim_jobs(1) == [jobs[1]]
+
+
+def test_job_queue_order_after_capped_claims(capture_queue, user_factory, pending_capture_job_factory):
+    """
+    Jobs passed over because their user is at their concurrent capture limit don't throw off the placement
+    of new jobs: a new user still joins the end of the first round.
+    """
+    capped_user = user_factory(max_concurrent_captures=1)
+    user_two = user_factory()
+    jobs = [
+        pending_capture_job_factory(user=capped_user),
+        pending_capture_job_factory(user=capped_user),
+        pending_capture_job_factory(user=user_two),
+        pending_capture_job_factory(user=user_two),
+        pending_capture_job_factory(user=user_two),
+    ]
+    assert [job.queue_position() for job in jobs] == [1, 3, 2, 4, 5]
+
+    # capped_user's second job is skipped, and user_two's second job claimed out of order
+    assert [CaptureJob.claim_jobs(1) for _ in range(3)] == [[jobs[0]], [jobs[2]], [jobs[3]]]
+
+    # capped_user's second job and user_two's last job are both in the first round now
+    new_job = pending_capture_job_factory(user=user_factory())
+    assert new_job.queue_position() == 3
+
+    jobs[0].mark_failed("Failed.")
+    assert CaptureJob.claim_jobs(3) == [jobs[1], jobs[4], new_job]
+
+
+@pytest.mark.parametrize('share', [0.25, None])
+def test_robot_queue_not_starved(capture_queue, settings, user_factory, pending_capture_job_factory, share):
+    """
+    Under sustained human load, robot jobs wait... unless a share of claims is reserved for them,
+    in which case they get that share, and no more, however many are waiting.
+    """
+    settings.ROBOT_CAPTURE_JOB_SHARE = share
+    get_robot_claim_share().reset()
+    human_users = [user_factory() for _ in range(3)]
+    robot_jobs = [pending_capture_job_factory(human=False) for _ in range(20)]
+
+    claimed = []
+    for _ in range(12):
+        for user in human_users:
+            pending_capture_job_factory(user=user, human=True)
+        claimed.append(CaptureJob.get_next_job(reserve=True))
+
+    if share:
+        assert [job for job in claimed if not job.human] == robot_jobs[:3]
+        assert [claimed.index(job) for job in robot_jobs[:3]] == [3, 7, 11]
+    else:
+        assert all(job.human for job in claimed)
+    get_robot_claim_share().reset()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_redis_queue_waits_for_commit(settings, pending_capture_job_factory):
+    """
+    Jobs are only mirrored into Redis once they are committed, so that workers never pop jobs they can't see yet.
+    """
+    settings.CAPTURE_QUEUE_BACKEND = 'main.queues.RedisQueue'
+    queue = get_capture_queue()
+    queue.reconcile()
+    with transaction.atomic():
+        job = pending_capture_job_factory(human=False)
+        assert queue.queue_depth(False) == 0
+    assert queue.queue_depth(False) == 1
+    assert CaptureJob.claim_jobs(1) == [job]
+
+
+def test_redis_queue_puts_back_unclaimed_jobs(settings, db):
+    """
+    Popped jobs that can't be claimed go back where they were, unless the database says they're no longer pending.
+    """
+    settings.CAPTURE_QUEUE_BACKEND = 'main.queues.RedisQueue'
+    queue = get_capture_queue()
+    queue.reconcile()
+    queue.add_scores([(queue.key(False), 12345, 1.5)])
+    assert CaptureJob.claim_jobs(1) == []
+    assert queue.redis.zscore(queue.key(False), 12345) == 1.5
+    queue.reconcile()
+    assert queue.queue_depth(False) == 0
+
+
+def test_redis_queue_claims_without_database(settings, db, pending_capture_job_factory, assert_num_queries):
+    """
+    Polling an empty Redis queue doesn't touch the database, even if it has pending jobs that Redis doesn't know
+    about: reconcile() picks those up.
+    """
+    settings.CAPTURE_QUEUE_BACKEND = 'main.queues.RedisQueue'
+    queue = get_capture_queue()
+    job = pending_capture_job_factory()
+    queue.reconcile()
+    queue.remove_jobs([job])
+    with assert_num_queries():
+        assert CaptureJob.claim_jobs(1) == []
+    queue.reconcile()
+    assert CaptureJob.claim_jobs(1) == [job]
+
+
 @pytest.mark.django_db(transaction=True)
 def test_race_condition_prevented(pending_capture_job_factory):
     """
@@ -78,6 +281,35 @@ def test_race_condition_prevented(pending_capture_job_factory):
     assert set(jobs) == set(fetched_jobs)
 
 
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('workers', [2, 8, 16])
+def test_claim_contention(pending_capture_job_factory, workers):
+    """
+    Drain a queue with many workers claiming at once: every job should be claimed exactly once.
+    """
+    jobs = [pending_capture_job_factory() for _ in range(workers * 5)]
+
+    def drain(i):
+        claimed = []
+        while True:
+            job = CaptureJob.get_next_job(reserve=True)
+            if not job:
+                break
+            claimed.append(job)
+        for connection in connections.all():
+            connection.close()
+        return claimed
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers) as e:
+        claimed = [job for jobs_claimed in e.map(drain, range(workers)) for job in jobs_claimed]
+    elapsed = time.monotonic() - start
+
+    assert len(claimed) == len(jobs), f"{workers} workers claimed {len(claimed)} of {len(jobs)} jobs in {elapsed:.2f}s."
+    assert set(claimed) == set(jobs)
+    assert not CaptureJob.objects.filter(status=CaptureJob.Status.PENDING).exists()
+
+
 @pytest.mark.django_db(transaction=True)
 def test_race_condition_not_prevented(pending_capture_job_factory):
     """
@@ -90,7 +322,7 @@ def test_race_condition_not_prevented(pending_capture_job_factory):
     CaptureJob.TEST_ALLOW_RACE = False
 
 
-def test_hard_timeout(pending_capture_job):
+def test_hard_timeout(pending_capture_job, caplog):
 
     # simulate a failed run_next_capture()
     job = CaptureJob.get_next_job(reserve=True)
@@ -112,3 +344,7 @@ def test_hard_timeout(pending_capture_job):
 
     # failed jobs will have a message indicating failure reason
     assert job.message[api_settings.NON_FIELD_ERRORS_KEY][0] == "Timed out."
+    assert job.capture_end_time
+
+    # each timed-out job is logged
+    assert f"Capture job {job.pk} for user {job.user_id}" in caplog.text
@@ -0,0 +1,63 @@
+import os
+import re
+import timeit
+
+from ..tasks import ScoopLogClassifier, scoop_log_classifier
+
+import pytest
+
+
+TRACE_LOG = os.path.join(os.path.dirname(__file__), 'files/scoop-trace.log')
+
+
+def legacy_classify(msg, milestones, info_events):
+    """
+    How handle_scoop_msg used to treat each line: decoding it, checking for each substring in turn,
+    and tidying it with three uncompiled regexes, whatever its kind.
+    """
+    def tidy_message(message):
+        cleaned = message
+        for pattern in [r'^\[.*?\]', r'\s*INFO\s*', r'\s*STEP \[.*?\]:\s*']:
+            cleaned = re.sub(pattern, '', cleaned)
+        return cleaned
+
+    msg = str(msg, 'utf-8')
+    if any(milestone in msg for milestone in milestones):
+        return (ScoopLogClassifier.MILESTONE, tidy_message(msg).strip())
+    elif any(event in msg for event in info_events):
+        return (ScoopLogClassifier.INFO, tidy_message(msg).strip())
+    tidy_message(msg)
+    return None
+
+
+def read_trace_log():
+    with open(TRACE_LOG, 'rb') as f:
+        return f.readlines() * 10
+
+
+def test_scoop_log_classifier():
+    """
+    Replay a trace-level Scoop log: the classifier should agree with the old line-by-line checks.
+    """
+    lines = read_trace_log()
+    milestones, info_events = scoop_log_classifier.milestones, scoop_log_classifier.info_events
+
+    expected = [legacy_classify(line, milestones, info_events) for line in lines]
+    events = [scoop_log_classifier.classify(line) for line in lines]
+
+    assert [tuple(event) if event else None for event in events] == expected
+    assert sum(1 for event in events if event and event.kind == ScoopLogClassifier.MILESTONE) == 10 * 15
+
+
+@pytest.mark.slow
+def test_scoop_log_classifier_speed():
+    """
+    Classifying a trace-level Scoop log should take less time than the old line-by-line checks did.
+    """
+    lines = read_trace_log()
+    milestones, info_events = scoop_log_classifier.milestones, scoop_log_classifier.info_events
+
+    legacy_elapsed = min(timeit.repeat(lambda: [legacy_classify(line, milestones, info_events) for line in lines], number=1, repeat=5))
+    elapsed = min(timeit.repeat(lambda: [scoop_log_classifier.classify(line) for line in lines], number=1, repeat=5))
+
+    assert elapsed < legacy_elapsed, f"Classified {len(lines)} lines in {elapsed * 1000:.1f}ms, compared to {legacy_elapsed * 1000:.1f}ms."
@@ -0,0 +1,73 @@
+import io
+import os
+
+from botocore.exceptions import ClientError
+from django.core.files import File
+
+from ..storages import get_archive_storage
+
+import pytest
+
+
+@pytest.fixture
+def archive_storage(settings):
+    """
+    Archive storage, in the local S3 stand-in (MinIO), using the smallest parts S3 allows.
+    """
+    settings.ARCHIVE_UPLOAD_PART_SIZE = 5 * 1024 * 1024
+    settings.ARCHIVE_UPLOAD_CONCURRENCY = 2
+    return get_archive_storage()
+
+
+def flaky_upload_part(mocker, client, failures):
+    """
+    Make client.upload_part fail the given number of times for part 2.
+    """
+    upload_part = client.upload_part
+    failed = []
+
+    def side_effect(**kwargs):
+        if kwargs['PartNumber'] == 2 and len(failed) < failures:
+            failed.append(kwargs['PartNumber'])
+            raise ClientError({'Error': {'Code': 'InternalError'}}, 'UploadPart')
+        return upload_part(**kwargs)
+    return mocker.patch.object(client, 'upload_part', side_effect=side_effect)
+
+
+def test_multipart_upload(archive_storage, mocker):
+    """
+    Files larger than a part are uploaded in parts, and a failed part is retried on its own.
+    """
+    contents = os.urandom(12 * 1024 * 1024)
+    upload_part = flaky_upload_part(mocker, archive_storage.connection.meta.client, failures=1)
+    mocker.patch('main.storages.sleep')
+
+    name = archive_storage.save('archive.wacz', File(io.BytesIO(contents)))
+
+    assert [call.kwargs['PartNumber'] for call in upload_part.call_args_list].count(2) == 2
+    assert len(upload_part.call_args_list) == 4
+    with archive_storage.open(name) as f:
+        assert f.read() == contents
+
+
+def test_multipart_upload_failure(archive_storage, mocker):
+    """
+    If a part fails every attempt, the upload is abandoned, leaving nothing behind.
+    """
+    client = archive_storage.connection.meta.client
+    flaky_upload_part(mocker, client, failures=archive_storage.upload_part_attempts)
+    mocker.patch('main.storages.sleep')
+
+    with pytest.raises(ClientError):
+        archive_storage.save('archive.wacz', File(io.BytesIO(os.urandom(12 * 1024 * 1024))))
+
+    assert not archive_storage.exists('archive.wacz')
+    assert not client.list_multipart_uploads(Bucket=archive_storage.bucket_name).get('Uploads')
+
+
+def test_small_files_upload_whole(archive_storage, mocker):
+    upload_part = mocker.spy(archive_storage.connection.meta.client, 'upload_part')
+    name = archive_storage.save('archive.wacz', File(io.BytesIO(b'wacz')))
+    assert not upload_part.called
+    with archive_storage.open(name) as f:
+        assert f.read() == b'wacz'
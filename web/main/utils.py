@@ -3,6 +3,8 @@ import datetime
 from functools import wraps
 import hashlib
 import hmac
+import io
+import os
 from pytz import timezone as tz
 import secrets
 import tarfile
@@ -163,58 +165,198 @@ def copy_file_to_container(src, dst_path, dst_name, container):
         return container.put_archive(path=dst_path, data=tmpfile)
 
 
-@contextmanager
-def extract_file_from_container(name, path, container):
-    # mode set to 'ab+' as a workaround for https://bugs.python.org/issue25341
-    with tempfile.TemporaryFile('ab+') as tmpfile:
-        stream, _ = container.get_archive(path)
-        for chunk in stream:
-            tmpfile.write(chunk)
-        tmpfile.seek(0)
-        tar = tarfile.open(fileobj=tmpfile)
-        file = tar.extractfile(name)
+class IterStream(io.RawIOBase):
+    """
+    A read-only, unseekable file-like view of an iterator of bytes, like the stream docker-py returns.
+
+    >>> stream = io.BufferedReader(IterStream(iter([b'ab', b'', b'cde'])))
+    >>> assert stream.read(4) == b'abcd' and stream.read() == b'e'
+    """
+    def __init__(self, iterator):
+        self.iterator = iterator
+        self.leftover = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
         try:
-            yield file
-        finally:
-            file.close()
-            tar.close()
+            chunk = self.leftover or next(self.iterator)
+            while not chunk:
+                chunk = next(self.iterator)
+        except StopIteration:
+            return 0
+        output, self.leftover = chunk[:len(buffer)], chunk[len(buffer):]
+        buffer[:len(output)] = output
+        return len(output)
+
+
+class ExtractedFile(tempfile.SpooledTemporaryFile):
+    """
+    A file extracted from a container, which knows its own size.
+    """
+    def __init__(self, filename, *args, **kwargs):
+        self.filename = filename
+        self.size = 0
+        super().__init__(*args, **kwargs)
 
 
 @contextmanager
-def extract_files_from_container(filenames, directory, container):
-    # mode set to 'ab+' as a workaround for https://bugs.python.org/issue25341
-    with tempfile.TemporaryFile('ab+') as tmpfile:
-        stream, _ = container.get_archive(directory)
-        for chunk in stream:
-            tmpfile.write(chunk)
-        tmpfile.seek(0)
-        tar = tarfile.open(fileobj=tmpfile)
-        file_handles = {}
-        for file in filenames:
-            try:
-                file_handles[file] = tar.extractfile(f"{directory}/{file}".lstrip("/"))
-            except KeyError:
-                file_handles[file] = None
-        try:
-            yield file_handles
-        finally:
-            for file in file_handles.values():
-                if file:
-                    file.close()
-            tar.close()
+def extract_files_from_container(filenames, directory, container, extra_files=False, chunk_size=1024*1024):
+    """
+    Stream a directory out of a container, in a single pass, parsing the tar stream as it arrives rather than
+    saving it first. The named files are spooled to temporary files; we stop reading as soon as they have all
+    turned up, unless `extra_files=True`, in which case every other file directly inside the directory is
+    spooled, too. Files aren't hashed as they are extracted: archives are hashed as they are uploaded instead
+    (see save_archive_file), which reads them once, wherever they came from.
+
+    Yields a dict of filename -> ExtractedFile, with None for any of `filenames` not found.
+
+    Given a container with some files in /tmp:
+    >>> mocker = getfixture('mocker')
+    >>> tar_bytes = io.BytesIO()
+    >>> with tarfile.open(fileobj=tar_bytes, mode='w') as tar:
+    ...     for name, contents in [('tmp/screenshot.png', b'png'), ('tmp/archive.wacz', b'wacz'), ('tmp/summary.json', b'{}'), ('tmp/other/file', b'')]:
+    ...         info = tarfile.TarInfo(name)
+    ...         info.size = len(contents)
+    ...         tar.addfile(info, io.BytesIO(contents))
+    >>> chunks = [tar_bytes.getvalue()[i:i+100] for i in range(0, len(tar_bytes.getvalue()), 100)]
+    >>> container = mocker.Mock(**{'get_archive.side_effect': lambda *args, **kwargs: (iter(chunks), {})})
+
+    We get the files we ask for, with their sizes...
+    >>> with extract_files_from_container(['archive.wacz', 'summary.json', 'missing.json'], '/tmp', container) as files:
+    ...     assert files['archive.wacz'].read() == b'wacz' and files['archive.wacz'].size == 4
+    ...     assert files['missing.json'] is None
+    ...     assert set(files) == {'archive.wacz', 'summary.json', 'missing.json'}
+
+    ...and, if we like, any other files in the directory, in the same pass.
+    >>> with extract_files_from_container(['archive.wacz'], '/tmp', container, extra_files=True) as files:
+    ...     assert files['screenshot.png'].read() == b'png'
+    ...     assert set(files) == {'archive.wacz', 'summary.json', 'screenshot.png'}
+    """
+    stream, _ = container.get_archive(directory, chunk_size=chunk_size)
+    # members are named relative to the directory's parent
+    prefix = f"{os.path.basename(directory.rstrip('/'))}/"
+    files = {filename: None for filename in filenames}
+    try:
+        with tarfile.open(fileobj=io.BufferedReader(IterStream(iter(stream)), chunk_size), mode='r|') as tar:
+            for member in tar:
+                name = member.name[len(prefix):] if member.name.startswith(prefix) else None
+                if not member.isfile() or not name or '/' in name or (name not in files and not extra_files):
+                    continue
+                files[name] = extracted_file = ExtractedFile(name, max_size=settings.EXTRACTED_FILE_MAX_MEMORY_SIZE)
+                source = tar.extractfile(member)
+                while True:
+                    chunk = source.read(chunk_size)
+                    if not chunk:
+                        break
+                    extracted_file.write(chunk)
+                extracted_file.size = extracted_file.tell()
+                extracted_file.seek(0)
+                if not extra_files and all(files[filename] for filename in filenames):
+                    break
+        yield files
+    finally:
+        if hasattr(stream, 'close'):
+            stream.close()
+        for extracted_file in files.values():
+            if extracted_file:
+                extracted_file.close()
+
+
+class DirectoryFile(io.BufferedReader):
+    """
+    A file on disk, opened for reading, which knows its own size.
+    """
+    def __init__(self, path, chunk_size=1024*1024):
+        super().__init__(io.FileIO(path, 'rb'), chunk_size)
+        self.filename = os.path.basename(path)
+        self.size = os.fstat(self.fileno()).st_size
 
 
-def get_file_hash(handle, chunk_size=1024, algorithm='sha256'):
+@contextmanager
+def read_files_from_directory(filenames, directory, extra_files=False):
     """
-    Calculate the file's hash.
+    The local equivalent of extract_files_from_container, for Scoop output written straight to a shared volume:
+    opens the named files, and, if `extra_files=True`, every other file directly inside the directory.
+
+    Yields a dict of filename -> DirectoryFile, with None for any of `filenames` not found.
+
+    >>> directory = getfixture('tmp_path')
+    >>> _ = (directory / 'archive.wacz').write_bytes(b'wacz')
+    >>> _ = (directory / 'screenshot.png').write_bytes(b'png')
+    >>> with read_files_from_directory(['archive.wacz', 'missing.json'], str(directory), extra_files=True) as files:
+    ...     assert files['archive.wacz'].read() == b'wacz' and files['archive.wacz'].size == 4
+    ...     assert files['missing.json'] is None
+    ...     assert set(files) == {'archive.wacz', 'screenshot.png', 'missing.json'}
     """
-    hasher = getattr(hashlib, algorithm)()
-    while True:
-        chunk = handle.read(chunk_size)
-        if not chunk:
-            break
-        hasher.update(chunk)
-    return (hasher.hexdigest(), algorithm)
+    names = list(filenames)
+    if extra_files:
+        names += [entry.name for entry in os.scandir(directory) if entry.is_file() and entry.name not in names]
+    files = {}
+    try:
+        for name in names:
+            path = os.path.join(directory, name)
+            files[name] = DirectoryFile(path) if os.path.isfile(path) else None
+        yield files
+    finally:
+        for file in files.values():
+            if file:
+                file.close()
+
+
+class HashingReader(io.RawIOBase):
+    """
+    A read-only view of a seekable file that hashes the file's contents as they are read through it, so that
+    a file can be uploaded and hashed in the same pass. Reads needn't be in order: hexdigest() reads whatever
+    part of the file hasn't yet been read in order, if any.
+
+    >>> reader = HashingReader(io.BytesIO(b'abcdef'))
+    >>> assert reader.size == 6 and reader.read(4) == b'abcd'
+    >>> _ = reader.seek(1)
+    >>> assert reader.read(2) == b'bc'
+    >>> assert reader.hexdigest() == hashlib.sha256(b'abcdef').hexdigest()
+    >>> assert reader.tell() == 3
+    """
+    def __init__(self, file, algorithm='sha256'):
+        self.file = file
+        self.algorithm = algorithm
+        self.hasher = getattr(hashlib, algorithm)()
+        # bytes hashed so far, in order, from the start of the file
+        self.hashed = 0
+        self.size = file.seek(0, io.SEEK_END)
+        self.position = file.seek(0)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self.position = self.file.seek(offset, whence)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def readinto(self, buffer):
+        data = self.file.read(len(buffer))
+        buffer[:len(data)] = data
+        if self.position == self.hashed:
+            self.hasher.update(data)
+            self.hashed += len(data)
+        self.position += len(data)
+        return len(data)
+
+    def hexdigest(self, chunk_size=1024*1024):
+        if self.hashed < self.size:
+            position = self.position
+            self.seek(self.hashed)
+            while self.read(chunk_size):
+                pass
+            self.seek(position)
+        return self.hasher.hexdigest()
 
 
 def override_storage_netloc(url):
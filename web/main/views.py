@@ -29,8 +29,9 @@ from rest_framework.views import APIView
 
 from .forms import SignupForm, UserForm, PasswordResetForm
 from .models import CaptureJob, User, WebhookSubscription
+from .queues import get_capture_queue
 from .serializers import CaptureJobSerializer, ReadOnlyCaptureJobSerializer, WebhookSubscriptionSerializer
-from .tasks import run_next_capture
+from .tasks import wake_capture_workers
 
 from .utils import serialize_form
 
@@ -215,7 +216,8 @@ class CaptureListView(APIView):
             url=Coalesce('validated_url', 'requested_url')
         )).order_by('-id')
         paginator = Paginator()
-        items = paginator.paginate_queryset(queryset, request, view=self)
+        # calculate queue positions for the whole page in the same query that fetches it
+        items = paginator.paginate_queryset(queryset.with_queue_position(), request, view=self)
         serializer = ReadOnlyCaptureJobSerializer(items, many=True)
         return paginator.get_paginated_response(serializer.data)
 
@@ -298,8 +300,7 @@ class CaptureListView(APIView):
             return ApiResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         if settings.LAUNCH_CAPTURE_JOBS:
-            for _ in range(len(request.data) if many else 1):
-                run_next_capture.apply_async()
+            wake_capture_workers(len(request.data) if many else 1)
 
         return ApiResponse(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -769,7 +770,7 @@ def webhook_test(request, format=None):
 @user_passes_test_or_403(lambda user: user.is_staff)
 def celery_queue_status(request):
     """
-    A simple report of how many tasks are in the main and background celery queues,
+    A simple report of how many tasks are in the main, background and finalize celery queues,
     what tasks are being processed by which workers, and how many tasks each worker
     has completed.
 
@@ -802,11 +803,15 @@ def celery_queue_status(request):
                 pass
 
     r = redis.from_url(settings.CELERY_BROKER_URL)
+    capture_queue = get_capture_queue()
 
     return render(request, 'manage/celery.html', {
         'queues': queues,
         'total_main_queue': r.llen('celery'),
-        'total_background_queue': r.llen('background')
+        'total_background_queue': r.llen('background'),
+        'total_finalize_queue': r.llen('finalize'),
+        'total_human_capture_jobs': capture_queue.queue_depth(human=True),
+        'total_robot_capture_jobs': capture_queue.queue_depth(human=False),
     })
 
 